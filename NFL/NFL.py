@@ -2,20 +2,25 @@ import re
 from abc import ABC, ABCMeta
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
 from datetime import date
-from extractor import DIM_Players_Mixin, Table, Fact, BaseClasses
+from extractor import DIM_Players_Mixin, Table, Fact, BaseClasses, Calc_Plan, ExtractTable, Page_Index, Table_Cache, Cached_Page, Fact_Encoder, Player_Registry, Exporter, Parquet_Exporter, pyarrow
 import logging
 import json
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 import scraping
 from pathlib import Path
 
-logging.basicConfig(
-    filename=f'logs/log_{date.today()}.txt',
-    level=logging.INFO,
-    format='%(levelname)s - %(message)s',
-    filemode='w'
-    )
+def start_logging():
+    # not at import- spawned transform workers re-import this module and would truncate the run's log
+    logging.basicConfig(
+        filename=f'logs/log_{date.today()}.txt',
+        level=logging.INFO,
+        format='%(levelname)s - %(message)s',
+        filemode='w'
+        )
 
 with open("teams.json") as f:
     teams = json.load(f)
@@ -47,6 +52,7 @@ class Stat_Cat(ABCMeta): # any flat class used to define a statistical category
                 if not hasattr(new_cls, attr):
                     raise TypeError(f"Class {name} must define '{attr}'")
 
+            new_cls.plan=Calc_Plan(new_cls) # compiled once here, so a category costs nothing extra to interpret per game
             Stat_Cat.registry.append(new_cls)
 
         return new_cls
@@ -55,69 +61,172 @@ class Stat_Cat(ABCMeta): # any flat class used to define a statistical category
 
 class HTML_Layer:
     def __init__(self,settings):
+        start_logging() # a no-op once the run has configured logging
         logging.info('Starting the html layer...\n')
         self.settings=settings
-        self.scraper=scraping.Scrape_HTML()
+        self.cache=scraping.HTML_Cache(settings.cache_dir) if settings.cache_dir else None
+        access=None
+        if settings.replay_dir:
+            logging.info(f'Replaying recorded pages from {settings.replay_dir}\n')
+            access=scraping.scrape_with_replay(settings.replay_dir,settings.replay_latency,settings.replay_error_rates)
+            self.cache=None # replays should only ever see the fixtures
+        self.scraper=scraping.Scrape_HTML(cache=self.cache,requests_options=settings.requests_options,access=access,record_dir=settings.record_dir,unwrap_ids=registered_table_ids())
+        self.pipelined=settings.pipelined==True and settings.scrape_games==True
         try:
             self.year=settings.year
+            self.archive=self.open_archive(settings)
+            self.manifest=scraping.Crawl_Manifest(self.archive.path/'manifest.jsonl') if self.archive is not None else None
+            self.hold_html=not (settings.streaming==True and self.archive is not None) # streaming runs read pages back from the archive one at a time
             self.team_htmls={}
             self.roster_htmls={}
             self.week_htmls={}
+            self.plan_crawl()
 
             if settings.scrape_teams==True or settings.scrape_rosters==True:
                 logging.debug('Scraping loop for teams/rosters triggered\n')
                 self.extract_teams()
+                if not self.hold_html:
+                    self.team_htmls=self.archive.pages_by_team('team')
+                    self.roster_htmls=self.archive.pages_by_team('roster')
+
+            if self.pipelined:
+                logging.info('Pipelined mode- boxscores will be scraped while the season is processed.\n')
+                return # the scraper stays open for stream_games, close() is called by the Season
 
             if settings.scrape_games==True:
                 for week in range(settings.start_week,settings.end_week+1):
                     logging.info(f'Now scraping html for week {week}\n')
                     self.week_htmls[week]=[]
-                    url=f'https://www.pro-football-reference.com/years/{settings.year}/week_{week}.htm'
+                    url=self.week_url(week)
                     logging.debug(f'Week URL: {url}')
-                    week_html=self.scraper.scrape(url)
-                    soup=BeautifulSoup(week_html,'html.parser')
-                    week_games=soup.find_all('div',class_='game_summaries')
-                    if len(week_games)==2:
-                        week_games=week_games[1]
-                    else:
-                        week_games=week_games[0]
-
-                    games=week_games.find_all('div',class_='game_summary expanded nohover')
+                    week_html=self.fetch(url,'week',week=week)
+                    links=self.game_links(week_html)
+                    games_count=len(links)
+                    self.plan_games(links,week)
 
-                    games_count=len(games)
-
-                    for i, game in enumerate(games):
+                    for i, url in enumerate(links):
                         logging.info(f'Scraping game {i} of {games_count}\n')
-                        game_link=game.find('td',class_='right gamelink')
-                        link=game_link.find('a')['href']
-                        url=f'https://www.pro-football-reference.com{link}'
-                        html=self.scraper.scrape(url)
-                        self.week_htmls[week].append(html)
-            self.save_html_dicts()
+                        html=self.fetch(url,'boxscore',week=week,index=i,wait_for=Passing.id)
+                        if self.hold_html:
+                            self.week_htmls[week].append(html)
+                    if not self.hold_html:
+                        self.week_htmls[week]=self.archive.week_pages(week)
+            self.finish_crawl()
+        except BaseException:
+            self.pipelined=False # make sure the scraper is released below
+            raise
         finally:
+            if not self.pipelined:
+                self.close()
+
+    @classmethod
+    def from_archive(cls,settings):
+        """Rebuilds the html layer from a previous crawl's archive without scraping."""
+        self=cls.__new__(cls)
+        self.settings=settings
+        self.year=settings.year
+        self.pipelined=False
+        self.scraper=None
+        self.cache=None
+        self.archive=self.open_archive(settings)
+        self.manifest=None
+        self.hold_html=False
+        if self.archive is None:
+            raise FileNotFoundError('from_archive needs settings.archive_dir')
+        self.team_htmls=self.archive.pages_by_team('team')
+        self.roster_htmls=self.archive.pages_by_team('roster')
+        self.week_htmls={week:self.archive.week_pages(week) for week in range(settings.start_week,settings.end_week+1)}
+        return self
+
+    @staticmethod
+    def open_archive(settings):
+        if not settings.archive_dir:
+            return None
+        return scraping.HTML_Archive(Path(settings.archive_dir)/str(settings.year))
+
+    def fetch(self,url,page_type,week=None,team=None,index=None,wait_for=None):
+        """Scrapes and archives a page, unless an earlier run already fetched it."""
+        if self.manifest is None:
+            return self.scraper.scrape(url,wait_for=wait_for)
+        self.manifest.plan(url,page_type,week=week,team=team,index=index)
+        if self.manifest.status(url)=='fetched':
+            html=self.archive.get(url)
+            if html is not None:
+                logging.debug(f'Already fetched {url}, skipping.')
+                return html
+        try:
+            html=self.scraper.scrape(url,wait_for=wait_for)
+        except Exception as e:
+            self.manifest.mark(url,'failed',error=e)
+            raise
+        entry=self.archive.append(url,html,page_type,week=week,team=team,index=index)
+        self.manifest.mark(url,'fetched',location={'archive':str(self.archive.data_path),'offset':entry['offset'],'length':entry['length']})
+        return html
+
+    def release_week(self,week):
+        self.week_htmls.pop(week,None)
+        self.week_htmls.pop(str(week),None)
+
+    def finish_crawl(self):
+        if self.manifest is not None:
+            self.manifest.finish()
+            logging.info('Crawl complete, manifest retired.\n')
+
+    def plan_crawl(self):
+        if self.manifest is None:
+            return
+        for team in teams:
+            base_url=f'https://www.pro-football-reference.com/teams/{teams[team]['url']}/'
+            team_abbr=teams[team]['abbr']
+            if self.settings.scrape_teams==True:
+                self.manifest.plan(base_url+f'{self.year}_roster.htm','roster',team=team_abbr)
+            if self.settings.scrape_rosters==True:
+                self.manifest.plan(base_url+f'{self.year}.htm','team',team=team_abbr)
+        if self.settings.scrape_games==True:
+            for week in range(self.settings.start_week,self.settings.end_week+1):
+                self.manifest.plan(self.week_url(week),'week',week=week)
+
+    def plan_games(self,links,week):
+        if self.manifest is None:
+            return
+        for i,url in enumerate(links):
+            self.manifest.plan(url,'boxscore',week=week,index=i)
+
+    def week_url(self,week):
+        return f'https://www.pro-football-reference.com/years/{self.year}/week_{week}.htm'
+
+    @staticmethod
+    def game_links(week_html):
+        soup=index_page(week_html,'week')
+        week_games=soup.find_all('div',class_='game_summaries')
+        if len(week_games)==2:
+            week_games=week_games[1]
+        else:
+            week_games=week_games[0]
+
+        games=week_games.find_all('div',class_='game_summary expanded nohover')
+        links=[]
+        for game in games:
+            game_link=game.find('td',class_='right gamelink')
+            link=game_link.find('a')['href']
+            links.append(f'https://www.pro-football-reference.com{link}')
+        return links
+
+    def stream_games(self,roster_index,weeks,executor=None,batch=False,wide=False):
+        workers=self.settings.parse_workers
+        if executor is not None:
+            workers=max(workers,self.settings.workers) # enough waiting threads to keep every process busy
+        return Game_Pipeline(self,roster_index,weeks,workers,executor,batch,wide)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+        if self.scraper is not None:
             self.scraper.quit()
             logging.info('Scraper quit.\n')
+        if self.cache is not None:
+            logging.info(f'HTML cache: {self.cache.hits} hits, {self.cache.misses} misses.\n')
 
-    def save_html_dicts(self, base_path="full_week_htmls_all/"):
-        import os
-
-        if base_path and not base_path.endswith("/"):
-            base_path += "/"
-
-        os.makedirs(base_path, exist_ok=True)
-
-        with open(f"{base_path}team_htmls.txt", "w", encoding="utf-8") as f:
-            for key, value in self.team_htmls.items():
-                f.write(f"{key}:\n{value}\n\n")
-
-        with open(f"{base_path}roster_htmls.txt", "w", encoding="utf-8") as f:
-            for key, value in self.roster_htmls.items():
-                f.write(f"{key}:\n{value}\n\n")
-
-        with open(f"{base_path}week_htmls.txt", "w", encoding="utf-8") as f:
-            json.dump(self.week_htmls, f, ensure_ascii=False)
-
-    
     def extract_teams(self):
         for team in teams:
             logging.info(f'Scraping {team}...\n')
@@ -127,13 +236,15 @@ class HTML_Layer:
             if self.settings.scrape_teams==True:
                 logging.debug('Extracting team details')
                 url=base_url+f'{self.year}_roster.htm'
-                roster_html=self.scraper.scrape(url)
-                self.roster_htmls[team_abbr]=roster_html
+                roster_html=self.fetch(url,'roster',team=team_abbr,wait_for=Roster.id)
+                if self.hold_html:
+                    self.roster_htmls[team_abbr]=roster_html
             if self.settings.scrape_rosters==True:
                 logging.debug('Extracting roster details...')
                 url=base_url+f'{self.year}.htm'
-                team_html=self.scraper.scrape(url)
-                self.team_htmls[team_abbr]=team_html
+                team_html=self.fetch(url,'team',team=team_abbr)
+                if self.hold_html:
+                    self.team_htmls[team_abbr]=team_html
             logging.debug('Finished\n')
 
 class default_pipeline_settings:
@@ -142,6 +253,119 @@ class default_pipeline_settings:
     scrape_rosters=True
     scrape_teams=True
     scrape_games=True
+    cache_dir='html_cache/' # set to None to always hit the network
+    pipelined=False # parse games while later boxscores are still being scraped
+    parse_workers=2
+    requests_options={'pool_size':4,'timeout':(5,30)} # headers can also be overridden here
+    record_dir=None # saves every page the run sees as a replayable fixture
+    replay_dir=None # runs offline against fixtures recorded with record_dir
+    replay_latency=0
+    replay_error_rates=None # e.g. {'transient':0.05,'throttled':0.01}
+    archive_dir='html_archive/' # every scraped page, indexed, see HTML_Layer.from_archive
+    streaming=False # one week in memory at a time, tables are appended to csv as each week finishes
+    workers=1 # processes for the game and roster transforms, 1 keeps everything in this process
+    table_cache_dir='table_cache/' # tables already extracted from a boxscore, reused until the page or their definition changes. None to turn off
+    compact_stats=False # FACT_Stats with integer keys for Player/Game_ID/Tm/Stat and float32 values, the keys are exported as KEYS_ tables
+    player_registry='player_registry.csv' # player ids kept across seasons and reruns, None hashes every roster from scratch
+    batch_stats=None # 'week' or 'season' runs each stat category once over all of that span's games instead of once per game
+    wide_stats=False # one table per Stat_Cat (FACT_Passing, ...) with a typed column per stat id instead of the long FACT_Stats, totals go to FACT_Passing_ToDate, ...
+    dashboard=True # the end-of-season Excel workbook, when not streaming
+    parquet_dir=None # e.g. 'parquet/', every table as a parquet dataset partitioned by year and week, appended as each week finishes
+
+class Game_Pipeline:
+    """Crawls boxscores on one fetch thread and builds each game as soon as it lands."""
+    def __init__(self,htmls,roster_index,weeks,workers=2,executor=None,batch=False,wide=False):
+        self.htmls=htmls
+        self.roster_index=roster_index
+        self.batch=batch
+        self.wide=wide
+        self.executor=executor # process pool for the transform itself, the parse threads then only wait on it
+        self.weeks=list(weeks)
+        self.year=htmls.year
+        self.urls=queue.Queue()
+        self.pool=ThreadPoolExecutor(max_workers=workers)
+        self.slots={}
+        self.week_ready={week:threading.Event() for week in self.weeks}
+        self.error=None
+        self.stopped=threading.Event()
+        if self.weeks:
+            self.urls.put(('week',self.weeks[0],None,htmls.week_url(self.weeks[0])))
+        else:
+            self.urls.put(None)
+        self.fetcher=threading.Thread(target=self.fetch_loop,daemon=True)
+        self.fetcher.start()
+
+    def fetch_loop(self):
+        try:
+            while True:
+                job=self.urls.get()
+                if job is None or self.stopped.is_set():
+                    break
+                kind,week,index,url=job
+                if kind=='week':
+                    html=self.htmls.fetch(url,'week',week=week)
+                    links=self.htmls.game_links(html)
+                    self.htmls.plan_games(links,week)
+                    logging.info(f'Week {week}: queued {len(links)} games.\n')
+                    if self.htmls.hold_html:
+                        self.htmls.week_htmls[week]=[None]*len(links)
+                    self.slots[week]=[Future() for _ in links]
+                    for i,link in enumerate(links):
+                        self.urls.put(('game',week,i,link))
+                    self.week_ready[week].set()
+                    position=self.weeks.index(week)+1
+                    if position<len(self.weeks):
+                        next_week=self.weeks[position]
+                        self.urls.put(('week',next_week,None,self.htmls.week_url(next_week)))
+                    else:
+                        self.urls.put(None)
+                else:
+                    html=self.htmls.fetch(url,'boxscore',week=week,index=index,wait_for=Passing.id)
+                    if self.htmls.hold_html:
+                        self.htmls.week_htmls[week][index]=html
+                    self.pool.submit(self.build_game,week,index,html)
+        except BaseException as e:
+            logging.error(f'Fetch worker stopped: {e}')
+            self.error=e
+            for slots in self.slots.values():
+                for slot in slots:
+                    self.resolve(slot,error=e)
+            for event in self.week_ready.values():
+                event.set()
+
+    def build_game(self,week,index,html):
+        slot=self.slots[week][index]
+        try:
+            if self.executor is not None:
+                game=self.executor.submit(transform_game,week,index+1,html,self.year,None,self.batch,self.wide).result()
+            else:
+                game=transform_game(week,index+1,html,self.year,self.roster_index,self.batch,self.wide)
+        except BaseException as e:
+            self.resolve(slot,error=e)
+        else:
+            self.resolve(slot,game=game)
+
+    @staticmethod
+    def resolve(slot,game=None,error=None):
+        try:
+            if error is not None:
+                slot.set_exception(error)
+            else:
+                slot.set_result(game)
+        except InvalidStateError: # already resolved by the other side of a race with a failing fetch
+            pass
+
+    def games(self,week):
+        self.week_ready[week].wait()
+        if week not in self.slots:
+            raise self.error
+        return [slot.result() for slot in self.slots[week]]
+
+    def close(self):
+        self.stopped.set()
+        self.urls.put(None)
+        self.fetcher.join()
+        self.pool.shutdown(wait=True)
 
 class Season_Mixins:
     def extract_from_html_list(self,element_list,elements):
@@ -174,7 +398,7 @@ class Team(Table,Season_Mixins):
     def __init__(self,team,htmls):
         team_abbr=teams[team]['abbr']
         html=htmls.team_htmls[team_abbr]
-        soup=BeautifulSoup(html,'html.parser')
+        soup=index_page(html,'team')
         team_details_area=soup.find('div',{'data-template':'Partials/Teams/Summary'})
         details=self.extract_from_html_box(team_details_area)
         if 'General_Manager' not in details:
@@ -192,6 +416,7 @@ class Team(Table,Season_Mixins):
         self.team_details=[team_abbr,team,self.Coach,self.Offensive_Coordinator,self.Defensive_Coordinator,self.General_Manager,self.Stadium]
 
 def run_pipeline(year):
+    start_logging()
     logging.info('Initializing pipeline...\n')
     settings=default_pipeline_settings
     settings.year=year
@@ -218,71 +443,200 @@ class Season(Season_Mixins):
         start_week=settings.start_week
         end_week=settings.end_week
 
-        if settings.scrape_rosters is True:
-            logging.debug('Extracting player tables...')
-            Players=DIM_Players(settings.year,htmls)
-            self.teamref=Players.df
-
-        week_objs=[]
-
-        if settings.scrape_teams is True:
-            teamrows=[]
-            for team in teams:
-                teamobj=Team(team,htmls)
-                teamrows.append(teamobj.team_details)
-            dim_teams=pd.DataFrame(teamrows,columns=['Team','Name','Head Coach','Offensive Coordinator','Defensive Coordinator','General Manager','Stadium'])
-            dim_teams['Team']=dim_teams['Team']+f'_{settings.year}'
-            self.dim_teams=dim_teams
-
-        fact_stats_dfs=[]
-        fact_scores_dfs=[]
-        dim_games_dfs=[]
-        dim_score_details_dfs=[]
-
-        for week in range(start_week,end_week):
-            logging.info(f'Starting week {week}...')
-            try:
-                week_htmls=self.htmls.week_htmls[week]
-            except KeyError:
-                week_htmls=self.htmls.week_htmls[str(week)]
-            
-            if week==1:
-                last_week=None
-            else:
-                last_week=week_objs[week-2]
-            week_obj=Week(week,settings.year,week_htmls,self.teamref,last_week)
-            week_objs.append(week_obj)
-            fact_stats_dfs.append(week_obj.fact_stats)
-            fact_scores_dfs.append(week_obj.scoring_df)
-            dim_games_dfs.append(week_obj.games_df)
-            dim_score_details_dfs.append(week_obj.score_details_df)
+        workers=settings.workers
+        cache=executor=pipeline=None
+        try: # the scraper is still open in pipelined mode, so it has to be closed however the transforms end
+            if settings.scrape_rosters is True:
+                logging.debug('Extracting player tables...')
+                registry=Player_Registry(settings.player_registry) if settings.player_registry else None
+                if workers>1:
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        Players=DIM_Players(settings.year,htmls,pool,registry)
+                else:
+                    Players=DIM_Players(settings.year,htmls,registry=registry)
+                if registry is not None:
+                    registry.save()
+                    logging.info(f'Player registry: {registry.summary()}')
+                self.teamref=Players.df
+                self.roster_index=Players.index
+
+            if settings.scrape_teams is True:
+                teamrows=[]
+                for team in teams:
+                    teamobj=Team(team,htmls)
+                    teamrows.append(teamobj.team_details)
+                dim_teams=pd.DataFrame(teamrows,columns=['Team','Name','Head Coach','Offensive Coordinator','Defensive Coordinator','General Manager','Stadium'])
+                dim_teams['Team']=dim_teams['Team']+f'_{settings.year}'
+                self.dim_teams=dim_teams
+
+            self.aggregator=Season_Aggregator()
+            self.encoder=Fact_Encoder({'Player':np.int32,'Game_ID':np.int32,'Tm':np.int16,'Stat':np.int16}) if settings.compact_stats else None
+            wide=settings.wide_stats
+            self.exporters=self.open_exporters(wide)
+            self.weeks={} # Week_ID -> week, to partition the season-wide stats
+            weekly_stats={} # every week's facts per table, totalled to date in one pass once the season is in
+            unmapped=set()
+            batch=settings.batch_stats
+            if batch=='season' and settings.streaming:
+                batch='week' # a streaming season only ever holds one week
+            season_raw={}
+
+            # the roster is handed to each worker once, only html goes out and compact frames come back per game
+            cache=use_table_cache(settings.table_cache_dir)
+            executor=ProcessPoolExecutor(max_workers=workers,initializer=init_transform_worker,initargs=(self.roster_index,settings.table_cache_dir)) if workers>1 else None
+            pipeline=htmls.stream_games(self.roster_index,range(start_week,end_week),executor,bool(batch),wide) if htmls.pipelined else None
+            for week in range(start_week,end_week):
+                logging.info(f'Starting week {week}...')
+                games=None
+                if pipeline is not None:
+                    week_htmls=None
+                    games=pipeline.games(week)
+                else:
+                    try:
+                        week_htmls=self.htmls.week_htmls[week]
+                    except KeyError:
+                        week_htmls=self.htmls.week_htmls[str(week)]
+
+                week_obj=Week(week,settings.year,week_htmls,self.roster_index,games,executor,batch,wide)
+                self.weeks[week_obj.week_id]=week_obj.week
+                unmapped.update(week_obj.unmapped)
+                for name,tables in week_obj.raw_stats.items():
+                    season_raw.setdefault(name,[]).extend(tables)
+                for name,stats in week_obj.stats.items():
+                    week_stats=stats.assign(Week_ID=week_obj.week_id)
+                    if settings.streaming: # only the running totals carry over to the next week
+                        self.emit_stats(self.totals_table(name),self.aggregate(name,week_stats),week_obj.week)
+                    else:
+                        weekly_stats.setdefault(name,[]).append(week_stats)
+                    self.emit_stats(name,stats,week_obj.week)
+                self.emit('FACT_Scoring',week_obj.scoring_df,week_obj.week)
+                self.emit('DIM_Games',week_obj.games_df,week_obj.week)
+                self.emit('DIM_Score_Details',week_obj.score_details_df,week_obj.week)
+                htmls.release_week(week)
+            if season_raw:
+                season_stats,season_unmapped=transform_stat_batches(season_raw,self.roster_index,wide)
+                unmapped.update(season_unmapped)
+                for name,stats in season_stats.items():
+                    weekly_stats.setdefault(name,[]).append(stats)
+                    for week_id,rows in stats.groupby('Week_ID',sort=False):
+                        self.emit_stats(name,rows.drop(columns=['Week_ID']),self.weeks[week_id])
+            for name,stats in weekly_stats.items():
+                for week_id,rows in self.aggregate(name,pd.concat(stats)).groupby('Game_ID',sort=False): # to date rows carry their week as the Game_ID
+                    self.emit_stats(self.totals_table(name),rows,self.weeks[week_id])
+            if unmapped:
+                logging.warning(f'{len(unmapped)} players not found in the roster: {sorted(unmapped)}')
+            if pipeline is not None:
+                htmls.finish_crawl()
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+            if htmls.pipelined:
+                htmls.close()
+            if executor is not None:
+                executor.shutdown(wait=True)
+            if cache is not None and executor is None:
+                logging.info(f'Table cache: {cache.summary()}')
             
         self.teamref.drop(columns=['Team'],inplace=True)
         self.teamref=self.teamref.drop_duplicates(subset=['Player_ID'])
 
-        fact_stats=pd.concat(fact_stats_dfs)
-        fact_stats['Tm']=fact_stats['Tm'].astype(str)+f'_{settings.year}'
-        fact_scoring=pd.concat(fact_scores_dfs)
-        dim_games=pd.concat(dim_games_dfs)
-        dim_score_details=pd.concat(dim_score_details_dfs)
-        
-        with pd.ExcelWriter(f'{self.save_path}\\dashboard.xlsx',mode='a',if_sheet_exists='replace') as writer:
-            fact_stats.to_excel(writer,sheet_name='FACT_Stats',index=False)
-            fact_scoring.to_excel(writer,sheet_name='FACT_Scoring',index=False)
-            dim_games.to_excel(writer,sheet_name='DIM_Games',index=False)
-            dim_score_details.to_excel(writer,sheet_name='DIM_Score_Details',index=False)
-            self.teamref.to_excel(writer,sheet_name='DIM_Players',index=False)
-            self.dim_teams.to_excel(writer,sheet_name='DIM_Teams',index=False)
-
-class Week(Fact):
-    def __init__(self,week,year,htmls,roster_table,last_week):
-        if len(str(week))==1:
-            week=f'0{week}'
+        self.emit('DIM_Players',self.teamref)
+        self.emit('DIM_Teams',self.dim_teams)
+        for name,df in self.key_tables().items():
+            self.emit(name,df)
+        for exporter in self.exporters:
+            exporter.close()
+
+    def open_exporters(self,wide):
+        settings=self.settings
+        exporters=[]
+        if settings.streaming:
+            exporters.append(CSV_Sink(self.save_path/'tables'))
+        elif settings.dashboard:
+            stat_tables=[f'FACT_{cat.__name__}{suffix}' for cat in Stat_Cat.registry for suffix in ('','_ToDate')] if wide else []
+            exporters.append(Excel_Dashboard(f'{self.save_path}\\dashboard.xlsx',stat_tables,self.encoder))
+        if settings.parquet_dir:
+            if pyarrow is None:
+                logging.warning('pyarrow is not installed- skipping the parquet export.')
+            else:
+                exporters.append(Parquet_Exporter(settings.parquet_dir))
+        return exporters
+
+    def emit_stats(self,name,df,week=None):
+        df=df.assign(Tm=df['Tm'].astype(str)+f'_{self.settings.year}')
+        if self.encoder is not None:
+            df=self.encoder.encode(df)
+        self.emit(f'FACT_{name}',df,week)
+
+    def totals_table(self,name):
+        if self.settings.wide_stats:
+            return f'{name}_ToDate' # wide totals only have the summary stats and calcs, so they can't share the per-game table's columns
+        return name
+
+    def aggregate(self,name,stats):
+        if self.settings.wide_stats:
+            return self.aggregator.add_wide(stats,name)
+        return self.aggregator.add(stats)
+
+    def key_tables(self):
+        if self.encoder is None:
+            return {}
+        return {f'KEYS_{col}':df for col,df in self.encoder.dictionaries().items()}
+
+    def emit(self,name,df,week=None):
+        partition={'year':self.settings.year}
+        if week is not None:
+            partition['week']=week
+        for exporter in self.exporters:
+            exporter.write(name,df,partition)
+
+class CSV_Sink(Exporter):
+    """Appends each table to its own csv as it is handed over."""
+    def __init__(self,path):
+        self.path=Path(path)
+        self.path.mkdir(parents=True,exist_ok=True)
+        self.started=set()
+
+    def write(self,name,df,partition=None):
+        file=self.path/f'{name}.csv'
+        first=name not in self.started
+        df.to_csv(file,mode='w' if first else 'a',header=first,index=False)
+        self.started.add(name)
+
+    def close(self):
+        logging.info(f'Season tables written to {self.path}')
+
+class Excel_Dashboard(Exporter):
+    """The season workbook, one sheet per table, written on close()."""
+    def __init__(self,path,stat_tables=(),encoder=None):
+        self.path=path
+        self.stat_tables=stat_tables
+        self.encoder=encoder
+        self.tables={}
+
+    def write(self,name,df,partition=None):
+        self.tables.setdefault(name,[]).append(df)
+
+    def close(self):
+        tables={name:pd.concat(dfs) for name,dfs in self.tables.items()}
+        wide=[tables[name] for name in self.stat_tables if name in tables]
+        if wide:
+            fact_stats=pd.concat([long_stats(df) for df in wide],ignore_index=True)
+            if self.encoder is not None:
+                fact_stats=self.encoder.encode(fact_stats) # only Stat and Value are left to encode
+                tables.update({f'KEYS_{col}':df for col,df in self.encoder.dictionaries().items()})
+            tables={'FACT_Stats':fact_stats,**tables}
+        with pd.ExcelWriter(self.path,mode='a',if_sheet_exists='replace') as writer:
+            for name,df in tables.items():
+                df.to_excel(writer,sheet_name=name,index=False)
+
+class Week:
+    def __init__(self,week,year,htmls,roster_index,games=None,executor=None,batch=None,wide=False):
+        week=self.week_key(week)
         self.week=week
         self.week_id=f'{week}{year}'
         self.dfs={
             'fact':{
-                'stats':[],
                 'scoring':[]
             },
             'dimension':{
@@ -290,18 +644,38 @@ class Week(Fact):
                 'score_details':[]
             }
         }
-        for i,html in enumerate(htmls,start=1):
-            game_obj=Game(self.week_id,i,html,roster_table,week,year)
-            self.dfs['fact']['scoring'].append(game_obj.scoring.fact_df)
-            self.dfs['fact']['stats'].append(game_obj.stats.df)
-            self.dfs['dimension']['games'].append(game_obj.game.df)
-            self.dfs['dimension']['score_details'].append(game_obj.scoring.dimension_df)
+        if games is None:
+            indexes=range(1,len(htmls)+1)
+            if executor is not None:
+                games=executor.map(transform_game,repeat(week),indexes,htmls,repeat(year),repeat(None),repeat(bool(batch)),repeat(wide)) # map keeps page order, so the merge matches a serial run
+            else:
+                games=map(transform_game,repeat(week),indexes,htmls,repeat(year),repeat(roster_index),repeat(bool(batch)),repeat(wide))
+        self.unmapped=set()
+        self.raw_stats={} # category name -> the raw tables of every game, batch mode only
+        stats={} # table name -> its frames from every game
+        for results in games:
+            self.unmapped.update(results['unmapped'])
+            self.dfs['fact']['scoring'].append(results['scoring'])
+            for name,raw in results['raw_stats'].items():
+                self.raw_stats.setdefault(name,[]).append(raw.assign(Week_ID=self.week_id))
+            for name,df in results['stats'].items():
+                stats.setdefault(name,[]).append(df)
+            self.dfs['dimension']['games'].append(results['games'])
+            self.dfs['dimension']['score_details'].append(results['score_details'])
 
         self.scoring_df=pd.concat(self.dfs['fact']['scoring'])
         self.score_details_df=pd.concat(self.dfs['dimension']['score_details'])
 
         games_df=pd.concat(self.dfs['dimension']['games'])
-        stats_df=pd.concat(self.dfs['fact']['stats'])
+        if batch=='week':
+            stats,unmapped=transform_stat_batches(self.raw_stats,roster_index,wide)
+            self.unmapped.update(unmapped)
+            self.stats={name:df.drop(columns=['Week_ID']) for name,df in stats.items()}
+            self.raw_stats={}
+        elif batch=='season':
+            self.stats={} # the Season transforms every week's raw tables at once
+        else:
+            self.stats={name:pd.concat(frames) for name,frames in stats.items()} # 'Stats', or one table per Stat_Cat when wide
         week_row = pd.DataFrame([{
             "Team_ID": self.week_id,
             "Game": "Week_Summary",
@@ -311,83 +685,169 @@ class Week(Fact):
         week_row = pd.DataFrame(week_row)
         self.games_df = pd.concat([games_df, week_row], ignore_index=True)
 
-        if last_week is None:
-            self.season_sum = stats_df.copy()
-            self.season_sum['Game_ID']=self.week_id
-
-        else:
-            self.sum_season_stats([last_week.season_sum,stats_df])
-        
-        self.fact_stats=pd.concat([self.season_sum,stats_df])
-        
-    def sum_season_stats(self,df_list):
-        merged_dfs=[]
-        for cat in Stat_Cat.registry:
-                dfs=[]
-                for df in df_list:
-                    filtered_df = df[df['Stat'].str.startswith(cat.identifier)]
-                    filtered_df = filtered_df[filtered_df['Stat'].isin(cat.summary_stats)]
-                    filtered_df=filtered_df.pivot(index=['Player','Tm'],columns=['Stat'],values='Value')
-                    filtered_df.columns.name=None
-                    filtered_df = filtered_df.reset_index()     
-                    dfs.append(filtered_df)
-                merged = dfs[0].merge(dfs[1], on='Player', how='outer')
-                merged = merged.fillna(0)
-                merged.drop(columns=['Tm_x'],inplace=True)
-                merged.rename(columns={'Tm_y':'Tm'},inplace=True)
-                filtered_=self.summerge(merged)
-
-                for calc in cat.season_calcs:
-                    if calc=='avg':
-                        form=lambda a,b:a/b
-                    elif calc=='pct':
-                        form=lambda a,b:(a/b)*100
-                    elif calc=='rat':
-                        form=lambda a,b:a/2
-                    for col in cat.season_calcs[calc]:
-                        inputs=cat.season_calcs[calc][col]
-                        filtered_[col]=form(filtered_[inputs[0]],filtered_[inputs[1]]).astype(float)
-                long=pd.melt(filtered_,id_vars=['Player','Tm'],value_name='Value',var_name='Stat')
-                merged_dfs.append(long)
-        self.season_sum=pd.concat(merged_dfs)
-        self.season_sum.fillna(0)
-        self.season_sum['Game_ID']=self.week_id
+    @staticmethod
+    def week_key(week):
+        if len(str(week))==1:
+            week=f'0{week}'
+        return week
+
+class Season_Aggregator:
+    """Season-to-date totals of every registered Stat_Cat, carried across calls."""
+    def __init__(self,categories=None):
+        categories=Stat_Cat.registry if categories is None else categories
+        self.summary_stats=[]
+        self.calcs=[]
+        self.means=set()
+        self.dtypes={} # the per-game dtype of each wide stat column, totals keep it
+        for cat in categories:
+            self.summary_stats+=[stat for stat in cat.plan.summary_stats if stat not in self.summary_stats]
+            self.calcs+=cat.plan.season_derived
+            self.means.update(cat.plan.season_means)
+            self.dtypes.update(cat.plan.wide_dtypes)
+        self.stat_order={stat:i for i,stat in enumerate(self.summary_stats+[calc[0] for calc in self.calcs])}
+        self.carried={} # table -> (totals, weeks played) of the last week added
+
+    def add(self,facts):
+        weeks=list(pd.unique(facts['Week_ID']))
+        stats=facts[facts['Stat'].isin(self.summary_stats)].assign(Value=lambda df:pd.to_numeric(df['Value'],errors='coerce'))
+        wide=self.accumulate(stats.groupby(['Player','Tm','Stat','Week_ID'],sort=False)['Value'].sum(),weeks,'Stats')
+        if wide is None:
+            return pd.DataFrame(columns=['Player','Game_ID','Tm','Stat','Value'])
+
+        long=wide.stack().dropna().rename('Value').reset_index()
+        long['week_order']=long['Week_ID'].map({week:i for i,week in enumerate(weeks)})
+        long['stat_order']=long['Stat'].map(self.stat_order)
+        long=long.sort_values(['week_order','stat_order'],kind='stable')
+        return long.rename(columns={'Week_ID':'Game_ID'})[['Player','Game_ID','Tm','Stat','Value']].reset_index(drop=True)
+
+    def add_wide(self,facts,table):
+        weeks=list(pd.unique(facts['Week_ID']))
+        stats=[col for col in facts.columns if col in self.summary_stats]
+        weekly=facts.groupby(['Player','Tm','Week_ID'],sort=False)[stats].sum().rename_axis(columns='Stat').stack()
+        wide=self.accumulate(weekly.reorder_levels(['Player','Tm','Stat','Week_ID']),weeks,table)
+        if wide is None:
+            return pd.DataFrame(columns=['Player','Game_ID','Tm']+stats)
+
+        wide=wide.astype({col:self.dtypes[col] for col in stats if col not in self.means and col in wide.columns})
+        wide=wide[sorted(wide.columns,key=self.stat_order.get)].rename_axis(columns=None).reset_index()
+        wide=wide.iloc[np.argsort(wide['Week_ID'].map({week:i for i,week in enumerate(weeks)}).to_numpy(),kind='stable')]
+        wide=wide.rename(columns={'Week_ID':'Game_ID'})
+        return wide[['Player','Game_ID','Tm']+[col for col in wide.columns if col not in ('Player','Game_ID','Tm')]].reset_index(drop=True)
+
+    def accumulate(self,weekly,weeks,table):
+        weekly=weekly.unstack('Week_ID').reindex(columns=weeks)
+        played=weekly.notna().cumsum(axis=1)
+        totals=weekly.fillna(0).cumsum(axis=1)
+        if table in self.carried:
+            carried_totals,carried_played=self.carried[table]
+            keys=carried_totals.index.union(totals.index,sort=False) # players keep the order they first appeared in
+            totals=totals.reindex(keys,fill_value=0).add(carried_totals.reindex(keys,fill_value=0),axis=0)
+            played=played.reindex(keys,fill_value=0).add(carried_played.reindex(keys,fill_value=0),axis=0)
+        if totals.empty:
+            return None
+        self.carried[table]=(totals[weeks[-1]],played[weeks[-1]])
+
+        means=totals.index.get_level_values('Stat').isin(self.means)
+        totals[means]=totals[means]/played[means]
+        totals=totals.where(played>0) # players only appear from their first week on
+
+        wide=totals.stack().dropna().unstack('Stat')
+        for col,calc,a,b in self.calcs:
+            if a not in wide.columns or b not in wide.columns:
+                continue
+            numerator=wide[a].to_numpy(dtype=float)
+            values=Calc_Plan.ops[calc](numerator,wide[b].to_numpy(dtype=float))
+            wide[col]=np.where(np.isnan(numerator),np.nan,values) # players without the category stay out of it
+        return wide
 
 # functions
 
 class Game:
-    def __init__(self,week_id,index,html,roster_table,week,year):
-        soup=BeautifulSoup(html,'html.parser')
+    def __init__(self,week_id,index,html,roster_index,week,year,batch=False,wide=False):
+        if table_cache is not None:
+            soup=Cached_Page(html,table_cache,lambda html:index_page(html,'boxscore'))
+        else:
+            soup=index_page(html,'boxscore')
         if len(str(index))==1:
             index=f'0{index}'
         self.game_id=f'{index}{week_id}'
-        self.scoring=Scoring_Tables(soup,self.game_id,roster_table)
+        self.scoring=Scoring_Tables(soup,self.game_id,roster_index)
         self.game=DIM_Games(soup,self.game_id,week,year)
-        self.stats=Fact_Stats(self.game_id,soup,roster_table,self.game.df)
+        self.stats=Fact_Stats(self.game_id,soup,roster_index,self.game.df,batch,wide)
+
+    def results(self):
+        return {
+            'scoring':self.scoring.fact_df,
+            'stats':self.stats.tables,
+            'raw_stats':self.stats.raw,
+            'games':self.game.df,
+            'score_details':self.scoring.dimension_df,
+            'unmapped':self.scoring.unmapped+self.stats.unmapped
+        }
+
+worker_roster=None
+table_cache=None # see use_table_cache
+
+def init_transform_worker(roster_index,table_cache_dir=None):
+    global worker_roster
+    worker_roster=roster_index
+    use_table_cache(table_cache_dir)
+
+def use_table_cache(path):
+    global table_cache
+    if path is not None and pyarrow is None:
+        logging.warning('pyarrow is not installed- games will be extracted without the table cache.')
+        path=None
+    table_cache=Table_Cache(path) if path is not None else None
+    return table_cache
+
+def transform_game(week,index,html,year,roster_index=None,batch=False,wide=False):
+    """Builds one game and returns only its frames, so no soup crosses a process boundary."""
+    if roster_index is None:
+        roster_index=worker_roster
+    week=Week.week_key(week)
+    return Game(f'{week}{year}',index,html,roster_index,week,year,batch,wide).results()
 
 class DIM_Games(Season_Mixins):
     def __init__(self,soup,game_id,week,year):
         self.soup=soup
 
-        scorebox=soup.find('div',class_='scorebox')
-        self.sects=scorebox.find_all('strong')
-
-        away_team_box=self.sects[0]
-        away_team=away_team_box.get_text().strip()
-
-        home_team_box=self.sects[2]
-        home_team=home_team_box.get_text().strip()
-
-
+        if isinstance(soup,Cached_Page):
+            details=soup.record('game_details',self.targets(),self.extract_details)
+        else:
+            details=self.extract_details(soup)
+        for attr,value in details.items():
+            setattr(self,attr,value)
 
-        self.home_team_key= teams[home_team]['abbr'].upper()
-        self.away_team_key=teams[away_team]['abbr'].upper()
+        self.home_team_key= teams[self.home_team]['abbr'].upper()
+        self.away_team_key=teams[self.away_team]['abbr'].upper()
 
         self.team_tags={
             self.home_team_key:f'{game_id}H',
             self.away_team_key:f'{game_id}A'
         }
 
+        game_desc=f'{self.home_team_key} v {self.away_team_key}'
+
+        base_list=[game_id,game_desc,week,year,self.game_date,self.game_time,self.stadium,self.roof,self.surface,self.ref]
+
+        home_row=[self.team_tags[self.home_team_key],self.home_team_key,self.away_team_key]+base_list
+        away_row=[self.team_tags[self.away_team_key],self.away_team_key,self.home_team_key]+base_list
+
+        rows=[home_row,away_row]
+
+        self.df=pd.DataFrame(rows,columns=['Team_ID','Team','Opponent','Game ID','Game','Week','Year','Date','Time','Stadium','Roof','Surface','Referee'])
+
+    def extract_details(self,soup):
+        scorebox=soup.find('div',class_='scorebox')
+        self.sects=scorebox.find_all('strong')
+
+        away_team_box=self.sects[0]
+        self.away_team=away_team_box.get_text().strip()
+
+        home_team_box=self.sects[2]
+        self.home_team=home_team_box.get_text().strip()
+
         game_details_area=soup.find('div',class_='scorebox_meta')
         game_details_list=game_details_area.find_all('div')
 
@@ -402,80 +862,83 @@ class DIM_Games(Season_Mixins):
         reftable=soup.find('table',id='officials')
         rows=reftable.find_all('td')
         self.extract_from_html_list(rows,ref_table_targets)
+        attrs=['home_team','away_team']+[attr for attr,idx in self.targets()]
+        return {attr:getattr(self,attr) for attr in attrs}
 
-        game_desc=f'{self.home_team_key} v {self.away_team_key}'
-
-        base_list=[game_id,game_desc,week,year,self.game_date,self.game_time,self.stadium,self.roof,self.surface,self.ref]
-
-        home_row=[self.team_tags[self.home_team_key],self.home_team_key,self.away_team_key]+base_list
-        away_row=[self.team_tags[self.away_team_key],self.away_team_key,self.home_team_key]+base_list
-
-        rows=[home_row,away_row]
-
-        self.df=pd.DataFrame(rows,columns=['Team_ID','Team','Opponent','Game ID','Game','Week','Year','Date','Time','Stadium','Roof','Surface','Referee'])
+    @staticmethod
+    def targets():
+        return [(k,v) for elements in (Game_Details,Other_Game_Details,ref_table_targets) for k,v in vars(elements).items() if not k.startswith('__')]
 
 class Fact_Stats: # orchestration
-    def __init__(self,game_id,soup,roster_table,game_table):
+    def __init__(self,game_id,soup,roster_index,game_table,batch=False,wide=False):
         logging.info('Extracting fact table data...')
         
-        dataframes=[]
+        self.tables={} # 'Stats' in long format, or one wide table per Stat_Cat
+        self.unmapped=[]
+        self.raw={}
+        if batch: # only extract, the Week or Season transforms each category once over every game's rows- see transform_stat_batches
+            team_ids=game_table.set_index('Team')['Team_ID']
+            for cat_cls in Stat_Cat.registry:
+                raw=ExtractTable(soup,cat_cls.id,getattr(cat_cls,'column_names',None),convert=False)
+                raw['Game_ID']=raw['Tm'].map(team_ids).to_numpy()
+                self.raw[cat_cls.__name__]=raw
+            return
 
         for cat_cls in Stat_Cat.registry:
             if cat_cls.cat=='defense':
                 instance=Defense_Table(soup,cat_cls)
             else:
-                instance=Stat_Table(soup,cat_cls,roster_table)
-            dataframes.append(instance.df)
-        self.df=pd.concat(dataframes)
-        self.Add_Game_IDs(game_table)
+                instance=Stat_Table(soup,cat_cls,roster_index,wide=wide)
+            self.tables[cat_cls.__name__]=self.Add_Game_IDs(instance.df,game_table)
+            self.unmapped+=getattr(instance,'unmapped',[])
+        if not wide:
+            self.tables={'Stats':pd.concat(self.tables.values())}
     
-    def Add_Game_IDs(self,game):
-        self.df['Game_ID'] = self.df['Tm'].map(game.set_index('Team')['Team_ID'])
-        self.df = self.df[['Player','Game_ID','Tm','Stat','Value']]
+    @staticmethod
+    def Add_Game_IDs(df,game):
+        df['Game_ID'] = df['Tm'].map(game.set_index('Team')['Team_ID'])
+        return df[['Player','Game_ID','Tm']+[col for col in df.columns if col not in ('Player','Game_ID','Tm')]]
+
+def transform_stat_batches(raw_stats,roster_index,wide=False):
+    """Runs each category once over the raw tables gathered from many games."""
+    frames={}
+    unmapped=[]
+    for cat_cls in Stat_Cat.registry:
+        tables=raw_stats.get(cat_cls.__name__)
+        if not tables:
+            continue
+        instance=Stat_Table(None,cat_cls,roster_index,raw=pd.concat(tables,ignore_index=True),keys=['Game_ID','Week_ID'],wide=wide)
+        ids=['Player','Game_ID','Tm']
+        frames[cat_cls.__name__]=instance.df[ids+[col for col in instance.df.columns if col not in ids+['Week_ID']]+['Week_ID']]
+        unmapped+=instance.unmapped
+    if not wide:
+        frames={'Stats':pd.concat(frames.values(),ignore_index=True)}
+    return frames,unmapped
+
+def long_stats(wide):
+    """Melts a wide stats table back into long Fact_Stats rows."""
+    return wide.melt(id_vars=list(wide.columns[:3]),var_name='Stat',value_name='Value').dropna(subset=['Value']) # to date rows only carry the summary stats and calcs
 
 class Stat_Table(Fact):
-    def __init__(self,soup,category,roster_table):
+    def __init__(self,soup,category,roster_index,raw=None,keys=(),wide=False):
         self.category=category
         logging.debug(f'Extracting {category.cat} data...')
         for k,v in category.__dict__.items():
             if not k.startswith('__'):
                 setattr(self,k,v)
         try:
-            super().__init__(category,soup)
+            super().__init__(category,soup,raw=raw,keys=keys)
         except MissingCols:
             raise MissingCols
 
-        self.df=self.df[self.df['Player']!='Player'].infer_objects(copy=False).fillna(0)
-        if hasattr(self, "cleaning"):
-            self.clean_table()
-        self.typecheck()
-        self.calculate_values()
-        self.long_now()
-        self.sub_ids(roster_table.copy())
-
-    def sub_ids(self,roster_table):
-        self.sub_player_ids(roster_table)
-        self.sub_stat_ids()
+        self.df=category.plan.run(self.df[self.df['Player']!='Player'],keys,wide)
+        self.sub_player_ids(roster_index)
 
-    def sub_player_ids(self,roster_table):
-        roster_table['merge_key'] = roster_table['Name'] + "_" + roster_table['Team']
-        self.df['merge_key'] = self.df['Player'] + "_" + self.df['Tm']
-        id_map = roster_table.set_index('merge_key')['Player_ID']
-        self.df['Player'] = self.df['merge_key'].map(id_map)
-
-        unmapped = self.df[self.df['Player'].isna()]
-        if not unmapped.empty:
-            logging.warning(f"Players not found in roster: {unmapped['merge_key'].unique()}")
-
-        self.df.drop(columns=['merge_key'], inplace=True)
-
-
-    def sub_stat_ids(self):
-        mapping_dict = dim_stats[self.category.cat]
-        self.df['Stat'] = self.df['Stat'].map(mapping_dict)
+    def sub_player_ids(self,roster_index):
+        self.df['Player'],self.unmapped=roster_index.lookup(self.df['Player'],self.df['Tm'],'Player_ID')
 
 class Scoring_Tables(Fact):
-    def __init__(self,soup,game_id,roster_table):
+    def __init__(self,soup,game_id,roster_index):
         global teams_df
         category=Scoring
         self.game_id=game_id
@@ -493,170 +956,117 @@ class Scoring_Tables(Fact):
         self.df['Tm'] = self.df['abbr']
         self.df = self.df.drop(columns=['mascot','abbr','location','url'])
         self.df = self.df.iloc[:, :-2]
-        self.quarter=1
-        self.df_rows=[]
-        self.dim_rows=[]
-        self.details={}
-        for i,row in enumerate(self.df.iterrows()):
-            self.score_id=f's{i}{self.game_id}'
-            row=row[1]
-            self.set_quarter(row['Quarter'])
-            dimension_row=[self.score_id,self.quarter,row['Tm'],self.game_id]
-            self.dim_rows.append(dimension_row)
-            self.details[self.score_id]=row['Detail']
-        self.fact=Fact_Scoring(self.details)
-        self.generate_dimension()
+        score_ids=[f's{i}{self.game_id}' for i in range(len(self.df))]
+        self.dimension_df=pd.DataFrame({
+            'Score_ID':score_ids,
+            'Quarter':self.fill_quarters(self.df['Quarter']).to_numpy(),
+            'Team':self.df['Tm'].to_numpy(),
+            'Game ID':self.game_id
+        })
+        self.fact=Fact_Scoring(pd.Series(self.df['Detail'].to_numpy(),index=score_ids))
         merge_df=pd.merge(left=self.fact.df,right=self.dimension_df,how='left',on='Score_ID')
 
-        #replace with a sub_id method in the fact class
-
-        merged = merge_df.merge(
-            roster_table[['Name','Team','Player']],
-            left_on=['Scorer','Team'],
-            right_on=['Name','Team'],
-            how='left'
-        )
-
-        merged = merged.drop(columns=['Scorer','Name','Team','Quarter']).rename(columns={'Player':'Scorer'})
-        merged = merged[['Score_ID','Scorer','Game ID','Detail','value']]
+        merge_df['Scorer'],self.unmapped=roster_index.lookup(merge_df['Scorer'],merge_df['Team'],'Player')
+        merged = merge_df[['Score_ID','Scorer','Game ID','Detail','value']]
         self.fact_df=merged
 
-    def generate_dimension(self):
-        self.dimension_df=pd.DataFrame(self.dim_rows,columns=['Score_ID','Quarter','Team','Game ID'])
-
-    def set_quarter(self,quarter):
-        try:
-            if int(self.quarter)>int(quarter):
-                return
-        except ValueError: #occurs when the game goes into overtime, resulting in the quarter being marked as "OT"
-            if quarter=='OT':
-                quarter=5
-                self.set_quarter(quarter)
-        self.quarter=quarter
+    @staticmethod
+    def fill_quarters(quarters):
+        # the quarter is only printed on its first scoring play, OT counts as the 5th
+        quarters=pd.to_numeric(quarters.replace('OT',5),errors='coerce').fillna(0)
+        return quarters.cummax().clip(lower=1).astype(np.int64)
         
 class Fact_Scoring(Fact):
+    """Parses the Detail text of every scoring play at once into long rows."""
+    score_pattern=r'^(.*?)(\d+)\s+yard\s+(.*)$'
+    fumble_pattern=r'^(.*?)fumble(.*)$'
+    passer_pattern=r'pass from\s*([A-Za-z .\'-]+?)(?=\(|$)'
+    methods=['field goal','pass','rush','kickoff return','blocked punt return','punt return'] # first match wins, anything else is an interception return
+    layouts={ # the details each kind of row carries, in the order they melt out
+        'TD':['Scorer','Passer','Type','Distance','Method'],
+        'FG':['Scorer','Type','Distance'],
+        'Safety':['Type'],
+        'XP failed':['Type','Good','Method'],
+        'XP':['Type','Good','Method','Scorer'],
+        'XP pass':['Type','Good','Method','Scorer','Passer']
+    }
+
     def __init__(self,details):
-        dfs=[]
-        for score in details:
-            df=self.parse_details(details[score])
-            try:
-                df['Score_ID']=score
-            except:
-                continue
-            dfs.append(df)
-        df=pd.concat(dfs)
-        Elphaba=pd.melt(df,id_vars=['Score_ID','Scorer'],var_name='Detail')
-        self.df=Elphaba[Elphaba['value'].notna()]
-        
-    def parse_details(self,details):
-        scorer, distance, other=self.parse_score(details)
-        if scorer==None:
-            df=self.parse_special(details)
-            return df
-        method=self.play_type(other)
-        if method=='pass':
-            passer=self.get_passer(other)
-        else:
-            passer = pd.NA
-        if method!='field goal':
-            type='TD'
-            if '(' not in other:
-                df=pd.DataFrame([[scorer,passer,type,distance,method]],columns=['Scorer','Passer','Type','Distance','Method'])
-                return df
-            detail=self.get_parenthetical(other)
-            dets=[[scorer,passer,type,distance,method]]
-            df1=pd.DataFrame(dets,columns=['Scorer','Passer','Type','Distance','Method'])
-            df2=self.get_extra_point(detail)
-            df=pd.concat([df1, df2], axis=0)
-        else:
-            type='FG'
-            dets=[[scorer,type,distance]]
-            df=pd.DataFrame(dets,columns=['Scorer','Type','Distance'])
-        return df
-    
-    def parse_special(self,details):
-        if 'Safety' in details:
-            type='Safety'
-            df=pd.DataFrame([[type]],columns=['Type'])
-            return df
-
-    def get_extra_point(self,detail):
-        type='XP'
-        if 'kick' in detail:
-            method='kick'
-        elif 'run' in detail:
-            method='run'
-        else:
-            method='pass'
-        if 'failed' in detail:
-            good=False
-            df=pd.DataFrame([[type,good,method]],columns=['Type','Good','Method'])
-            return df
-        else:
-            good=True
-        desc=detail.replace(method,'').strip()
-        if method!='pass':
-            scorer=desc
-            df=pd.DataFrame([[type,good,method,scorer]],columns=['Type','Good','Method','Scorer'])
-            return df
-        else:
-            parts=re.split(r'from',desc,1)
-            left=parts[0].strip()
-            right=parts[1].strip()
-            scorer=left.strip()
-            passer=right.strip()
-            df=pd.DataFrame([[type,good,method,scorer,passer]],columns=['Type','Good','Method','Scorer','Passer'])
-            return df
-
-    def get_parenthetical(self,s):
-        m=re.search(r'\((.*?)\)', s)
-        if m:
-            detail=m.group(1).strip()
-            return detail
-        return None
-
-    def get_passer(self,s):
-        m=re.search(r'pass from\s*([A-Za-z .\'-]+?)(?=\(|$)', s, flags=re.IGNORECASE)
-        if m:
-            return m.group(1).strip()
-        return None
-
-    def play_type(self,s):
-        s=s.lower()
-        if 'field goal' in s:
-            return 'field goal'
-        elif 'pass' in s:
-            return 'pass'
-        elif 'rush' in s:
-            return 'rush'
-        elif 'kickoff return' in s:
-            return 'kickoff return'
-        elif 'blocked punt return' in s:
-            return 'blocked punt return'
-        elif 'punt return' in s:
-            return 'punt return'
-        elif 'interception return':
-            return 'interception return'
-        else:
-            return 'unidentified'
-
-    def parse_score(self,text):
-        m=re.search(r'^(.*?)(\d+)\s+yard\s+(.*)$',text)
-        if not m:
-            if 'fumble' in text:
-                
-                idx = text.lower().find("fumble")
-                if idx != -1:
-                    left = text[:idx].strip()
-                    right = 'fumble '+text[idx+len("fumble"):].strip()
-                    num=0
-                    return left,num,right
-            else:
-                return None,None,None
-        left=m.group(1).strip()
-        num=int(m.group(2))
-        right=m.group(3)
-        return left,num,right
+        if details.empty: # nobody scored
+            self.df=pd.DataFrame(columns=['Score_ID','Scorer','Detail','value'])
+            return
+        text=pd.Series(details.astype(str).to_numpy(),dtype=object)
+        score_ids=details.index.to_numpy()
+        plays,other=self.parse_plays(text)
+        extra_points=self.parse_extra_points(other,plays['kind']=='TD')
+        rows=pd.concat([plays,extra_points])
+        rows=rows[rows['kind'].notna()].sort_values(['play','row'],kind='stable')
+        rows['Score_ID']=score_ids[rows['play'].to_numpy()]
+
+        order=[]
+        for kind in rows['kind'].unique():
+            order+=[col for col in self.layouts[kind] if col not in order]
+        for col in order:
+            carried=rows['kind'].isin([kind for kind,cols in self.layouts.items() if col in cols])
+            rows[col]=rows[col].where(carried)
+        wide=rows[['Score_ID','Scorer']+[col for col in order if col!='Scorer']]
+        Elphaba=pd.melt(wide,id_vars=['Score_ID','Scorer'],var_name='Detail')
+        self.df=Elphaba[Elphaba['value'].notna()].reset_index(drop=True)
+
+    def parse_plays(self,text):
+        yard=text.str.extract(self.score_pattern)
+        fumble=text.str.extract(self.fumble_pattern,flags=re.IGNORECASE)
+        matched=yard[1].notna()
+        fumbled=~matched&text.str.contains('fumble',regex=False)
+        scored=matched|fumbled
+        safety=~scored&text.str.contains('Safety',regex=False)
+
+        scorer=yard[0].str.strip().where(matched,fumble[0].str.strip().where(fumbled))
+        distance=pd.to_numeric(yard[1]).where(matched,0).where(scored)
+        other=yard[2].where(matched,('fumble '+fumble[1].str.strip()).where(fumbled))
+
+        lower=other.fillna('').str.lower()
+        method=pd.Series(np.select([lower.str.contains(m,regex=False) for m in self.methods],self.methods,default='interception return'),dtype=object).where(scored)
+        passer=other.str.extract(self.passer_pattern,flags=re.IGNORECASE)[0].str.strip().where(method=='pass')
+        kind=pd.Series(np.select([scored&(method=='field goal'),scored,safety],['FG','TD','Safety'],default=''),dtype=object).replace('',None)
+        plays=pd.DataFrame({
+            'play':np.arange(len(text)),
+            'row':0,
+            'kind':kind,
+            'Scorer':scorer,
+            'Passer':passer,
+            'Type':kind,
+            'Distance':distance,
+            'Method':method,
+            'Good':None
+        })
+        return plays,other
+
+    def parse_extra_points(self,other,touchdowns):
+        has_try=touchdowns&other.str.contains('(',regex=False).fillna(False)
+        if not has_try.any():
+            return None
+        detail=other[has_try].str.extract(r'\((.*?)\)')[0].str.strip().fillna('')
+        method=pd.Series(np.select([detail.str.contains('kick',regex=False),detail.str.contains('run',regex=False)],['kick','run'],default='pass'),index=detail.index,dtype=object)
+        failed=detail.str.contains('failed',regex=False)
+        desc=detail.copy()
+        for m in ['kick','run','pass']:
+            desc=desc.where(method!=m,detail.str.replace(m,'',regex=False).str.strip())
+        passing=desc.str.partition('from')
+        scorer=desc.where(method!='pass',passing[0].str.strip()).where(~failed)
+        passer=passing[2].str.strip().where((method=='pass')&~failed)
+        kind=pd.Series(np.select([failed,method=='pass'],['XP failed','XP pass'],default='XP'),index=detail.index,dtype=object)
+        return pd.DataFrame({
+            'play':detail.index.to_numpy(),
+            'row':1,
+            'kind':kind,
+            'Scorer':scorer,
+            'Passer':passer,
+            'Type':'XP',
+            'Distance':np.nan,
+            'Method':method,
+            'Good':(~failed).astype(object)
+        })
 
 class Score:
     def __init__(self,details,type):
@@ -838,6 +1248,7 @@ class Defense():
     id='player_defense'
     cat='defense'
     identifier='d'
+    column_names={'def_int_yds':'int_Yds','def_int_td':'int_TD'} # interception and fumble return Yds/TD share their header text
     cleaning = {
         'Cmp%': [
             {'target': '%', 'replace_with': ''}
@@ -923,11 +1334,14 @@ class Defense_Table(Stat_Table): #extension
         except MissingCols: # defense table will fail shapecheck on import- shapecheck occurs after renaming duplicate columns
             pass
 
-        box_1=self.df.iloc[:,:2]
-        box_2=self.df.iloc[:,2:7].rename(columns={'Yds':'int_Yds','TD':'int_TD'})
-        box_3=self.df.iloc[:,7:]
+        if 'int_Yds' in self.df.columns: # already split apart by data-stat on extraction, see Defense.column_names
+            self.base_defense=self.df
+        else:
+            box_1=self.df.iloc[:,:2]
+            box_2=self.df.iloc[:,2:7].rename(columns={'Yds':'int_Yds','TD':'int_TD'})
+            box_3=self.df.iloc[:,7:]
 
-        self.base_defense=pd.concat([box_1,box_2,box_3],axis=1)
+            self.base_defense=pd.concat([box_1,box_2,box_3],axis=1)
 
         self.df=self.base_defense
 
@@ -971,7 +1385,6 @@ class Players_Table(Table):
         super().__init__(Roster,soup)
         self.df=self.df[self.df['No.'] != 'No.'].reset_index(drop=True)
         self.df.drop(columns=['Drafted (tm/rnd/yr)'],inplace=True)
-        self.df['Yrs']=self.df['Yrs'].replace('Rook', 0)
         self.base_roster=self.df.copy()
         starters=self.get_starters()
         self.base_roster['Starter']=self.base_roster['Player'].isin(starters)
@@ -983,28 +1396,54 @@ class Players_Table(Table):
         my_list=self.df['Player'].tolist()
         return my_list
 
+class Team_Roster:
+    def __init__(self,team_abbr,html,year):
+        soup=index_page(html,'roster')
+        table=Players_Table(soup,year)
+        self.df=table.base_roster.copy()
+        self.df['Team']=team_abbr
+
+def transform_roster(team_abbr,html,year):
+    return Team_Roster(team_abbr,html,year).df
+
 class DIM_Players(DIM_Players_Mixin):
-    def __init__(self,year,htmls):
+    def __init__(self,year,htmls,executor=None,registry=None):
         self.year=year
-        self.dfs={}
-
-        for team in teams:
-            html=htmls.roster_htmls[teams[team]['abbr']]
-            soup=BeautifulSoup(html,'html.parser')
-            table=Players_Table(soup,year)
-            self.df=table.base_roster.copy()
-            self.generate_player_id(self.df['Player'],self.df['BirthDate'])
-            self.df['Team']=teams[team]['abbr']
-            self.dfs[teams[team]['abbr']]=self.df
+        abbrs=[teams[team]['abbr'] for team in teams]
+        roster_htmls=(htmls.roster_htmls[abbr] for abbr in abbrs)
+        mapper=executor.map if executor is not None else map
+        self.dfs=dict(zip(abbrs,mapper(transform_roster,abbrs,roster_htmls,repeat(year))))
         self.df=pd.concat(self.dfs)
+        self.generate_player_id(self.df['Player'],self.df['BirthDate'],registry) # one batch for the whole league, against the registry when there is one
         
         cols = self.df.columns.tolist()
         for col in ['Player_ID','Player'][::-1]:
             cols.insert(0, cols.pop(cols.index(col)))
         self.df = self.df[cols]
+        self.index=Roster_Index(self.df)
 
         logging.debug(self.df)
 
+class Roster_Index:
+    """(name, team) -> player keys for the season, built once from DIM_Players."""
+    def __init__(self,roster):
+        keys=self.keys(roster['Name'],roster['Team'])
+        first=~keys.duplicated().to_numpy()
+        self.index=pd.Index(keys.to_numpy()[first])
+        self.columns={col:roster[col].to_numpy()[first] for col in ['Player_ID','Player']}
+
+    @staticmethod
+    def keys(names,teams):
+        names=names.astype(str).str.casefold().str.replace(r'\s+',' ',regex=True).str.strip()
+        return names+'|'+teams.astype(str).str.strip().str.upper()
+
+    def lookup(self,names,teams,column='Player_ID'):
+        positions=self.index.get_indexer(self.keys(names,teams))
+        values=np.append(self.columns[column],np.nan)[positions] # -1 picks the trailing NaN
+        missing=(positions==-1)&names.notna().to_numpy() # nameless rows like safeties aren't misses
+        unmapped=list(zip(names[missing],teams[missing]))
+        return pd.Series(values,index=names.index,dtype=object),unmapped
+
 # DIM_Teams
 
 class Team_Details_1:
@@ -1021,7 +1460,25 @@ class Team_Details_2:
 
 # helpers
 
-class Scraper_Settings:
+def registered_table_ids():
+    """Every element id the transform reads. Pages are scraped with only these comments unwrapped."""
+    ids=[cat.id for cat in Stat_Cat.registry]
+    ids+=[Defense.id,Advanced_Defense.id,Scoring.id,Roster.id,Starters.id,'game_info','officials']
+    return ids
+
+def index_page(html,page_type):
+    """Single parse of a page into the shared element index its consumers read from."""
+    if page_type=='boxscore':
+        return Page_Index(html,ids=registered_table_ids(),classes=['scorebox','scorebox_meta'])
+    if page_type=='roster':
+        return Page_Index(html,ids=[Roster.id,Starters.id])
+    if page_type=='team':
+        return Page_Index(html,templates=['Partials/Teams/Summary'])
+    if page_type=='week':
+        return Page_Index(html,classes=['game_summaries'])
+    raise ValueError(f'No element index defined for {page_type} pages')
+
+class Scraper_Settings(default_pipeline_settings): # same defaults, only the scope of the run is set per instance
     def __init__(self,rosters,teams,games,start_week,end_week):
         self.scrape_rosters=rosters
         self.scrape_teams=teams
@@ -1,7 +1,24 @@
 from abc import ABC, abstractmethod
 import re
 import time
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import random
+import zlib
+from collections.abc import Mapping, Sequence
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,9 +29,12 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
 class HTML_Scraper(ABC):
+    validators=None # ETag/Last-Modified of the last page loaded, for backends that support conditional requests
+    throttled=True # False for backends that never touch the live site, so they skip the rate limiter
+
     @abstractmethod
-    def load_page(self):
-        """Unique method for extracting raw html"""
+    def load_page(self,url,validators=None,wait_for=None):
+        """Unique method for extracting raw html. None when the server reports the page unchanged."""
         raise NotImplementedError()
 
     @abstractmethod
@@ -25,63 +45,420 @@ class HTML_Scraper(ABC):
 class ExtractionFailed(Exception):
     pass
 
+class Throttled(ExtractionFailed):
+    """The server asked us to slow down (429, or a Retry-After header)."""
+    def __init__(self,retry_after=None):
+        super().__init__(f'Throttled, retry after {retry_after}s' if retry_after else 'Throttled')
+        self.retry_after=retry_after
+
+class Blocked(ExtractionFailed):
+    """A 403 or a block page served in place of the requested page."""
+    pass
+
+class Crawl_Blocked(ExtractionFailed):
+    """Raised once the circuit breaker has tripped too many times."""
+    pass
+
+block_markers=['Rate Limited Request','Your access has been blocked','Access Denied']
+
+def check_block(html):
+    head=html[:5000] # block pages are tiny, and the marker always sits in the title/header
+    for marker in block_markers:
+        if marker in head:
+            raise Blocked(marker)
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0,float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0,parsedate_to_datetime(value).timestamp()-time.time())
+    except (TypeError, ValueError):
+        return None
+
+def unwrap_comments(raw,ids=None):
+    """Un-comments only the html comments holding one of the given ids, any table when ids is None."""
+    if ids is None:
+        target=re.compile(rb'<table')
+    else:
+        target=re.compile(rb'id=["\'](?:'+b'|'.join(re.escape(i.encode('utf-8')) for i in ids)+rb')["\']')
+    pieces=[]
+    copied=0
+    pos=0
+    while True:
+        start=raw.find(b'<!--',pos)
+        if start==-1:
+            break
+        end=raw.find(b'-->',start+4)
+        if end==-1:
+            break
+        if target.search(raw,start+4,end):
+            pieces.append(raw[copied:start])
+            pieces.append(raw[start+4:end])
+            copied=end+3
+        pos=end+3
+    if not pieces:
+        return raw
+    pieces.append(raw[copied:])
+    return b''.join(pieces)
+
+class HTML_Cache:
+    """Compressed on-disk copy of every scraped page, fresh for a window set per page class."""
+    ttls={
+        'boxscore':6*3600,
+        'week':6*3600,
+        'roster':24*3600,
+        'team':24*3600,
+        'other':24*3600
+    }
+    final_page_types=['boxscore','week'] # once a season is over these pages stop changing
+
+    def __init__(self,path='html_cache/',ttls=None):
+        self.path=Path(path)
+        self.path.mkdir(parents=True,exist_ok=True)
+        self.ttls={**self.ttls,**(ttls or {})}
+        self.hits=0
+        self.misses=0
+
+    @staticmethod
+    def normalize_url(url):
+        parts=urlsplit(url.strip())
+        query=urlencode(sorted(parse_qsl(parts.query)))
+        path=parts.path or '/'
+        return urlunsplit((parts.scheme.lower(),parts.netloc.lower(),path,query,''))
+
+    @classmethod
+    def key(cls,url):
+        return hashlib.sha256(cls.normalize_url(url).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def page_type(url):
+        path=urlsplit(url).path
+        if '/boxscores/' in path:
+            return 'boxscore'
+        if re.search(r'/years/\d{4}/week_\d+\.htm',path):
+            return 'week'
+        if path.endswith('_roster.htm'):
+            return 'roster'
+        if re.search(r'/teams/\w+/\d{4}\.htm',path):
+            return 'team'
+        return 'other'
+
+    @staticmethod
+    def season_finished(url):
+        # a season labelled Y ends with the Super Bowl in February of Y+1
+        path=urlsplit(url).path
+        m=re.search(r'/(?:years|teams/\w+)/(\d{4})',path) or re.search(r'/boxscores/(\d{4})(\d{2})',path)
+        if not m:
+            return False
+        year=int(m.group(1))
+        if '/boxscores/' in path and int(m.group(2))<3: # january/february games belong to the previous season
+            year-=1
+        return date.today()>=date(year+1,3,1)
+
+    def ttl(self,url):
+        page_type=self.page_type(url)
+        if page_type in self.final_page_types and self.season_finished(url):
+            return None
+        return self.ttls[page_type]
+
+    def _paths(self,url):
+        key=self.key(url)
+        folder=self.path/key[:2]
+        return folder/f'{key}.html.gz', folder/f'{key}.json'
+
+    def _meta(self,url):
+        try:
+            with open(self._paths(url)[1],encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get(self,url,allow_stale=False):
+        """Cached html, or None if the page was never cached or has gone stale."""
+        body_path=self._paths(url)[0]
+        meta=self._meta(url)
+        if meta is None:
+            self.misses+=1
+            return None
+        ttl=self.ttl(url)
+        if not allow_stale and ttl is not None and time.time()-meta['fetched_at']>ttl:
+            logging.debug(f'Cached copy of {url} is stale.')
+            self.misses+=1
+            return None
+        try:
+            html=gzip.decompress(body_path.read_bytes()).decode('utf-8')
+        except (FileNotFoundError, OSError, EOFError):
+            self.misses+=1
+            return None
+        self.hits+=1
+        return html
+
+    def validators(self,url):
+        # ETag/Last-Modified of the cached copy, for a conditional request
+        meta=self._meta(url)
+        if meta is None or not self._paths(url)[0].exists():
+            return None
+        return meta.get('validators') or None
+
+    def put(self,url,html,validators=None):
+        body_path,meta_path=self._paths(url)
+        body_path.parent.mkdir(exist_ok=True)
+        body_path.write_bytes(gzip.compress(html.encode('utf-8'),compresslevel=6))
+        self._write_meta(url,validators)
+
+    def touch(self,url,validators=None):
+        self._write_meta(url,validators or self.validators(url))
+
+    def _write_meta(self,url,validators):
+        meta={'url':self.normalize_url(url),'page_type':self.page_type(url),'fetched_at':time.time(),'validators':validators}
+        with open(self._paths(url)[1],'w',encoding='utf-8') as f: # metadata is written last so a half-written body is never treated as a hit
+            json.dump(meta,f)
+
+class Rate_Limiter:
+    """Spaces outbound requests at least interval seconds apart."""
+    def __init__(self,interval=6):
+        self.interval=interval
+        self.last_request=None
+        self.waited=0.0
+        self.requests=0
+        self._lock=threading.Lock()
+
+    def wait(self):
+        # call right before a request
+        with self._lock: # held while sleeping so concurrent callers queue up behind each other
+            if self.last_request is not None:
+                remaining=self.interval-(time.monotonic()-self.last_request)
+                if remaining>0:
+                    time.sleep(remaining)
+                    self.waited+=remaining
+            self.last_request=time.monotonic()
+            self.requests+=1
+
+    def summary(self):
+        return f'{self.requests} requests, {self.waited:.1f}s spent waiting on the rate limit'
+
+class Retry_Policy:
+    """Backoff after a failed page, and a circuit breaker that pauses the crawl on repeated blocks."""
+    def __init__(self,max_attempts=3,base_delay=6,max_delay=300,jitter=0.25,block_threshold=3,cooldown=900,max_trips=3):
+        self.max_attempts=max_attempts
+        self.base_delay=base_delay
+        self.max_delay=max_delay
+        self.jitter=jitter
+        self.block_threshold=block_threshold
+        self.cooldown=cooldown
+        self.max_trips=max_trips
+        self.consecutive_blocks=0
+        self.trips=0
+        self.open_until=None
+        self.waited=0.0
+        self.outcomes={'success':0,'throttled':0,'blocked':0,'transient':0}
+
+    @staticmethod
+    def classify(error):
+        if error is None:
+            return 'success'
+        if isinstance(error,Throttled):
+            return 'throttled'
+        if isinstance(error,Blocked):
+            return 'blocked'
+        return 'transient'
+
+    def delay(self,attempt,error):
+        # exponential with jitter, a longer Retry-After wins
+        delay=min(self.max_delay,self.base_delay*2**(attempt-1))
+        delay*=random.uniform(1-self.jitter,1+self.jitter)
+        retry_after=getattr(error,'retry_after',None)
+        if retry_after is not None:
+            delay=max(delay,min(retry_after,self.max_delay*4))
+        return delay
+
+    def record(self,error=None):
+        outcome=self.classify(error)
+        self.outcomes[outcome]+=1
+        if outcome=='blocked':
+            self.consecutive_blocks+=1
+            if self.consecutive_blocks>=self.block_threshold:
+                self.trip()
+        elif outcome=='success':
+            self.consecutive_blocks=0
+            self.trips=0
+        return outcome
+
+    def trip(self):
+        self.trips+=1
+        if self.trips>self.max_trips:
+            logging.critical(f'Still blocked after {self.max_trips} pauses, stopping the crawl.')
+            raise Crawl_Blocked
+        pause=self.cooldown*2**(self.trips-1)
+        logging.error(f'{self.consecutive_blocks} pages blocked in a row, pausing the crawl for {pause/60:.0f} minutes.')
+        self.open_until=time.monotonic()+pause
+        self.consecutive_blocks=self.block_threshold-1 # half-open: one more block reopens the breaker straight away
+
+    def before_request(self):
+        if self.open_until is None:
+            return
+        remaining=self.open_until-time.monotonic()
+        if remaining>0:
+            time.sleep(remaining)
+            self.waited+=remaining
+        self.open_until=None
+
+    def backoff(self,attempt,error):
+        delay=self.delay(attempt,error)
+        logging.warning(f'Attempt {attempt} failed ({self.classify(error)}: {error}). Retrying in {delay:.1f}s...')
+        time.sleep(delay)
+        self.waited+=delay
+
+    def summary(self):
+        counts=', '.join(f'{k}: {v}' for k,v in self.outcomes.items())
+        return f'{counts}, {self.waited:.1f}s spent backing off'
+
 class Scrape_HTML:
-    def __init__(self):
-        self.test_request()
+    def __init__(self,cache=None,limiter=None,requests_options=None,policy=None,access=None,record_dir=None,unwrap_ids=None):
+        self.cache=cache
+        self.unwrap_ids=unwrap_ids
+        self.limiter=limiter or Rate_Limiter(6) # PFR allows 20 requests a minute, 6 seconds leaves plenty of headroom
+        self.policy=policy or Retry_Policy()
+        self.requests_options=requests_options or {}
+        self.recorder=Fixture_Store(record_dir) if record_dir else None
+        if access is not None:
+            self.access=access # e.g. scrape_with_replay, no need to probe the live site
+        else:
+            self.test_request()
 
     def test_request(self):
-        resp = requests.get('https://www.pro-football-reference.com/boxscores/202409080buf.htm')
-        raw_html = resp.text
+        backend=scrape_with_requests(unwrap_ids=self.unwrap_ids,**self.requests_options)
+        self.limiter.wait()
+        try:
+            test_html=backend.load_page('https://www.pro-football-reference.com/boxscores/202409080buf.htm')
+        except ExtractionFailed:
+            test_html=''
 
-        test_html = re.sub(r'<!--.*?-->', '', raw_html, flags=re.DOTALL)
         soup = BeautifulSoup(test_html, 'html.parser')
         table = soup.find('table', id='passing_advanced')
 
         if table:
-            self.access = scrape_with_requests()
+            self.access = backend # the session that passed the test is kept, along with its open connection
         else:
-            self.access=scrape_with_selenium() #requests can access the webpage just fine, but sometimes gets blocked by anti-bot filters. This is session-wide, not page specific. Selenium does not have this problem.
+            backend.quit()
+            self.access=scrape_with_selenium(unwrap_ids=self.unwrap_ids) #requests can access the webpage just fine, but sometimes gets blocked by anti-bot filters. This is session-wide, not page specific. Selenium does not have this problem.
 
-    def scrape(self, url,attempt=1,max_attempts=3):
+    def scrape(self, url,max_attempts=None,wait_for=None):
         """load_page methods do not parse HTML into BeautifulSoup. Sometimes the HTML is immediately parsed, but in many cases it is stored for later processing—after Selenium has finished—to improve efficiency."""
-        try:
-            html=self.access.load_page(url)
-        except ExtractionFailed:
-            if attempt<max_attempts: # since 3 is not greater than 3, this will trigger a failure on loop 3
-                logging.warning(f'Attempt {attempt} failed. Retrying...')
-                attempt+=1
-                time.sleep(6) # ensures the halt always happens, since running load_page will query the server again(only happens in case of failure, there is never a double sleep)
-                return self.scrape(url,attempt)
-            else:
-                raise ExtractionFailed
-        time.sleep(6) # ensures compliance with PFR rate limit
+        validators=None
+        if self.cache is not None:
+            html=self.cache.get(url)
+            if html is not None:
+                logging.debug(f'Cache hit for {url}')
+                self.record(url,html)
+                return html # no request was made, so there is nothing to wait out
+            validators=self.cache.validators(url)
+        max_attempts=max_attempts or self.policy.max_attempts
+        for attempt in range(1,max_attempts+1):
+            self.policy.before_request()
+            if self.access.throttled:
+                self.limiter.wait() # ensures compliance with PFR rate limit, retries included
+            try:
+                html=self.access.load_page(url,validators,wait_for)
+                if html is None:
+                    html=self.cache.get(url,allow_stale=True)
+                    if html is not None:
+                        logging.debug(f'{url} unchanged since it was cached.')
+                        self.cache.touch(url,self.access.validators)
+                        self.policy.record()
+                        self.record(url,html)
+                        return html
+                    validators=None
+                    raise ExtractionFailed('Cached copy disappeared after a 304') # cached body vanished between the validator lookup and now
+            except ExtractionFailed as e:
+                self.policy.record(e)
+                if attempt==max_attempts:
+                    raise
+                self.policy.backoff(attempt,e)
+                continue
+            self.policy.record()
+            break
+        if self.cache is not None:
+            self.cache.put(url,html,self.access.validators)
+        self.record(url,html)
         return html
+
+    def record(self,url,html):
+        if self.recorder is not None:
+            self.recorder.put(url,html)
     
     def quit(self):
        self.access.quit()
+       logging.info(f'Scraper finished: {self.limiter.summary()}. Outcomes- {self.policy.summary()}.')
 
 class scrape_with_requests(HTML_Scraper):
-    def __init__(self):
-        pass
+    headers={
+        'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+        'Accept':'text/html,application/xhtml+xml',
+        'Accept-Encoding':ACCEPT_ENCODING, # only advertises br/zstd when the decoder for them is installed
+        'Connection':'keep-alive'
+    }
 
-    def load_page(self, url):
-        try:
-            resp = requests.get(url)
-            html = re.sub(r'<!--.*?-->', '', resp.text, flags=re.DOTALL)
-            return html
+    def __init__(self,pool_size=4,timeout=(5,30),headers=None,base_url=None,unwrap_ids=None):
+        self.timeout=timeout
+        self.unwrap_ids=unwrap_ids # commented-out tables to restore, see unwrap_comments
+        self.base_url=base_url # points the backend at a Replay_Server instead of the live site
+        self.session=requests.Session()
+        adapter=HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size)
+        self.session.mount('https://',adapter)
+        self.session.mount('http://',adapter)
+        self.session.headers.update({**self.headers,**(headers or {})})
 
-        except Exception:
+    def load_page(self, url, validators=None, wait_for=None):
+        conditional={}
+        if validators:
+            if validators.get('etag'):
+                conditional['If-None-Match']=validators['etag']
+            if validators.get('last_modified'):
+                conditional['If-Modified-Since']=validators['last_modified']
+        if self.base_url:
+            parts=urlsplit(url)
+            url=self.base_url.rstrip('/')+urlunsplit(('','',parts.path,parts.query,''))
+        try:
+            resp = self.session.get(url,headers=conditional,timeout=self.timeout)
+        except Exception as e:
             logging.warning(f'FAILED requests scrape of: {url}')
-            raise ExtractionFailed
+            raise ExtractionFailed(e)
+
+        if resp.status_code==304:
+            self.validators=validators
+            return None
+        retry_after=parse_retry_after(resp.headers.get('Retry-After'))
+        if resp.status_code==429 or (resp.status_code==503 and retry_after is not None):
+            raise Throttled(retry_after)
+        if resp.status_code==403:
+            raise Blocked(f'HTTP 403 for {url}')
+        if resp.status_code>=400:
+            raise ExtractionFailed(f'HTTP {resp.status_code} for {url}')
+        raw=resp.content
+        html=unwrap_comments(raw,self.unwrap_ids).decode(resp.encoding or 'utf-8',errors='replace')
+        check_block(html)
+        self.validators={'etag':resp.headers.get('ETag'),'last_modified':resp.headers.get('Last-Modified')}
+        return html
         
     def quit(self):
-        pass
+        self.session.close()
 
 class scrape_with_selenium(HTML_Scraper):
-    def __init__(self):
+    blocked_urls=['*.png','*.jpg','*.jpeg','*.gif','*.webp','*.svg','*.ico','*.css','*.woff','*.woff2','*.ttf','*.mp4',
+                  '*googlesyndication.com*','*doubleclick.net*','*googletagmanager.com*','*google-analytics.com*','*amazon-adsystem.com*']
+    driver_cache=Path.home()/'.cache'/'pfr_extractor'/'chromedriver_path.txt'
+
+    def __init__(self,timeout=10,unwrap_ids=None):
+        self.timeout=timeout
+        self.unwrap_ids=unwrap_ids # commented-out tables to restore, see unwrap_comments
         self.start_driver()
 
-    def load_page(self, url):
+    def load_page(self, url, validators=None, wait_for=None): # the browser manages its own cache, validators are ignored
         logging.debug(f'Attempting Selenium scrape for {url}')
 
         try:
@@ -92,20 +469,23 @@ class scrape_with_selenium(HTML_Scraper):
             logging.debug(f'While attempting to extract page, the following error occurred: {e}')
             raise ExtractionFailed
 
+        target=(By.ID, f'all_{wait_for}') if wait_for else (By.TAG_NAME, "table") # the all_ wrapper div is never commented out, unlike the table itself
         try:
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "table"))
+            WebDriverWait(self.driver, self.timeout).until(
+                EC.presence_of_element_located(target)
             )
         except:
-            logging.error("Timed out waiting for table in Selenium")
+            check_block(self.driver.page_source) # a block page never contains the element, so report it as such rather than as a timeout
+            logging.error(f"Timed out waiting for {target[1]} in Selenium")
             raise ExtractionFailed
 
-        return self.driver.page_source   
+        return unwrap_comments(self.driver.page_source.encode('utf-8'),self.unwrap_ids).decode('utf-8')
 
     def start_driver(self):
         logging.info('No active driver detected, starting new webdriver...')
-        service = Service(ChromeDriverManager().install())
+        service = Service(self.resolve_driver())
         options = Options()
+        options.page_load_strategy = 'eager' # hand the page back at DOMContentLoaded rather than after every ad and image
         options.add_argument("--headless")
         options.add_argument("--disable-gpu")
         options.add_argument("--no-sandbox")
@@ -114,8 +494,334 @@ class scrape_with_selenium(HTML_Scraper):
         options.add_argument("--log-level=3")
         options.add_argument("window-size=1920,1080")
         options.add_argument("--ignore-certificate-errors")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option('prefs',{'profile.managed_default_content_settings.images':2})
         self.driver = webdriver.Chrome(service=service, options=options)
+        try:
+            self.driver.execute_cdp_cmd('Network.enable',{})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs',{'urls':self.blocked_urls}) # stylesheets, fonts and ad scripts have no prefs switch
+        except Exception as e:
+            logging.warning(f'Unable to block subresources, pages will load in full: {e}')
+
+    def resolve_driver(self):
+        # reuses the last installed chromedriver so startup needs no network call
+        try:
+            path=Path(self.driver_cache.read_text(encoding='utf-8').strip())
+            if path.is_file():
+                logging.debug(f'Using cached chromedriver at {path}')
+                return str(path)
+        except FileNotFoundError:
+            pass
+        try:
+            path=ChromeDriverManager().install()
+        except Exception as e:
+            logging.warning(f'Unable to install chromedriver ({e}), falling back to Selenium Manager.')
+            return None
+        self.driver_cache.parent.mkdir(parents=True,exist_ok=True)
+        self.driver_cache.write_text(path,encoding='utf-8')
+        return path
 
     def quit(self):
         self.driver.quit()
         logging.info('Webdriver successfuly closed.\n')
+
+# archive
+
+class HTML_Archive:
+    """Append-only, zlib-compressed archive of a crawl's pages with a jsonl index."""
+    def __init__(self,path):
+        self.path=Path(path)
+        self.path.mkdir(parents=True,exist_ok=True)
+        self.data_path=self.path/'pages.dat'
+        self.index_path=self.path/'index.jsonl'
+        self.data_path.touch()
+        self.entries={}
+        self._lock=threading.Lock()
+        self._map=None
+        self._load_index()
+
+    def _load_index(self):
+        size=self.data_path.stat().st_size
+        try:
+            with open(self.index_path,encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry=json.loads(line)
+                    except json.JSONDecodeError: # a line cut short by a crash, the page will simply be scraped again
+                        continue
+                    if entry['offset']+entry['length']<=size:
+                        self.entries[entry['url']]=entry
+        except FileNotFoundError:
+            pass
+
+    def append(self,url,html,page_type=None,week=None,team=None,index=None):
+        url=HTML_Cache.normalize_url(url)
+        body=html.encode('utf-8')
+        digest=hashlib.sha1(body).hexdigest()
+        with self._lock:
+            existing=self.entries.get(url)
+            if existing is not None and existing['sha1']==digest:
+                return existing
+            blob=zlib.compress(body,6)
+            with open(self.data_path,'ab') as f:
+                offset=f.tell()
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            entry={'url':url,'page_type':page_type or HTML_Cache.page_type(url),'week':week,'team':team,'index':index,
+                   'offset':offset,'length':len(blob),'sha1':digest,'archived_at':time.time()}
+            with open(self.index_path,'a',encoding='utf-8') as f: # index line goes in after the data, so it never points at missing bytes
+                f.write(json.dumps(entry)+'\n')
+            self.entries[url]=entry
+        return entry
+
+    def read(self,entry):
+        with self._lock:
+            end=entry['offset']+entry['length']
+            if self._map is None or len(self._map)<end:
+                if self._map is not None:
+                    self._map.close()
+                with open(self.data_path,'rb') as f:
+                    self._map=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            blob=self._map[entry['offset']:end]
+        return zlib.decompress(blob).decode('utf-8')
+
+    def get(self,url):
+        entry=self.entries.get(HTML_Cache.normalize_url(url))
+        if entry is None:
+            return None
+        return self.read(entry)
+
+    def find(self,page_type=None,week=None,team=None):
+        """Index entries matching every filter given, in (week, index) order."""
+        matches=[e for e in self.entries.values()
+                 if (page_type is None or e['page_type']==page_type)
+                 and (week is None or e['week']==week)
+                 and (team is None or e['team']==team)]
+        return sorted(matches,key=lambda e:(e['week'] or 0,e['index'] or 0,e['url']))
+
+    def pages_by_team(self,page_type):
+        return Archive_Pages(self,{e['team']:e for e in self.find(page_type)})
+
+    def week_pages(self,week):
+        return Archive_Week(self,self.find('boxscore',week=week))
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map=None
+
+class Crawl_Manifest:
+    """Append-only log of every planned url's status, so an interrupted crawl can resume."""
+    def __init__(self,path):
+        self.path=Path(path)
+        self.entries={}
+        self._lock=threading.Lock()
+        try:
+            with open(self.path,encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry=json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry['url']]={**self.entries.get(entry['url'],{}),**entry}
+        except FileNotFoundError:
+            pass
+        if self.entries:
+            counts=self.counts()
+            logging.info(f'Resuming crawl from manifest: {counts}')
+
+    def _write(self,entry):
+        with self._lock:
+            self.entries[entry['url']]={**self.entries.get(entry['url'],{}),**entry}
+            with open(self.path,'a',encoding='utf-8') as f:
+                f.write(json.dumps(entry)+'\n')
+
+    def plan(self,url,page_type,week=None,team=None,index=None):
+        url=HTML_Cache.normalize_url(url)
+        if url not in self.entries:
+            self._write({'url':url,'page_type':page_type,'week':week,'team':team,'index':index,'status':'pending'})
+
+    def status(self,url):
+        entry=self.entries.get(HTML_Cache.normalize_url(url))
+        return entry['status'] if entry else None
+
+    def mark(self,url,status,location=None,error=None):
+        entry={'url':HTML_Cache.normalize_url(url),'status':status,'updated_at':time.time()}
+        if location is not None:
+            entry['location']=location
+        if error is not None:
+            entry['error']=str(error)
+        self._write(entry)
+
+    def counts(self):
+        counts={}
+        for entry in self.entries.values():
+            counts[entry['status']]=counts.get(entry['status'],0)+1
+        return counts
+
+    def finish(self):
+        if self.path.exists():
+            self.path.replace(self.path.with_name(f'{self.path.stem}_{int(time.time())}.done'))
+        self.entries={}
+
+class Archive_Pages(Mapping):
+    """Read-only dict view over archived pages."""
+    def __init__(self,archive,entries):
+        self.archive=archive
+        self.entries=entries
+
+    def __getitem__(self,key):
+        return self.archive.read(self.entries[key])
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+class Archive_Week(Sequence):
+    def __init__(self,archive,entries):
+        self.archive=archive
+        self.entries=entries
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self.archive.read(e) for e in self.entries[i]]
+        return self.archive.read(self.entries[i])
+
+    def __len__(self):
+        return len(self.entries)
+
+# record/replay
+
+class Fixture_Store:
+    """Plain html copies of scraped pages for record and replay."""
+    def __init__(self,path):
+        self.path=Path(path)
+        self.path.mkdir(parents=True,exist_ok=True)
+        self.index_path=self.path/'index.json'
+        self._lock=threading.Lock()
+        try:
+            with open(self.index_path,encoding='utf-8') as f:
+                self.index=json.load(f)
+        except FileNotFoundError:
+            self.index={}
+
+    def put(self,url,html):
+        url=HTML_Cache.normalize_url(url)
+        name=f'{HTML_Cache.key(url)}.html'
+        (self.path/name).write_text(html,encoding='utf-8')
+        with self._lock:
+            self.index[url]=name
+            with open(self.index_path,'w',encoding='utf-8') as f:
+                json.dump(self.index,f,indent=1)
+
+    def get(self,url):
+        name=self.index.get(HTML_Cache.normalize_url(url))
+        if name is None:
+            return None
+        return (self.path/name).read_text(encoding='utf-8')
+
+class Fault_Injector:
+    """Simulated latency and failures for replayed pages."""
+    def __init__(self,latency=0,error_rates=None,seed=None):
+        self.latency=latency
+        self.error_rates=error_rates or {}
+        self.random=random.Random(seed) # seeded so a benchmark sees the same failures on every run
+        self._lock=threading.Lock()
+
+    def next_fault(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            roll=self.random.random()
+        for fault in ['throttled','blocked','transient']:
+            rate=self.error_rates.get(fault,0)
+            if roll<rate:
+                return fault
+            roll-=rate
+        return None
+
+class scrape_with_replay(HTML_Scraper):
+    """Serves recorded fixtures in place of the live site."""
+    throttled=False
+
+    def __init__(self,fixture_dir,latency=0,error_rates=None,seed=None):
+        self.fixtures=Fixture_Store(fixture_dir)
+        self.faults=Fault_Injector(latency,error_rates,seed)
+
+    def load_page(self, url, validators=None, wait_for=None):
+        fault=self.faults.next_fault()
+        if fault=='throttled':
+            raise Throttled(1)
+        if fault=='blocked':
+            raise Blocked(f'Injected block for {url}')
+        if fault=='transient':
+            raise ExtractionFailed(f'Injected failure for {url}')
+        html=self.fixtures.get(url)
+        if html is None:
+            logging.warning(f'No fixture recorded for {url}')
+            raise ExtractionFailed(f'No fixture for {url}')
+        return html
+
+    def quit(self):
+        pass
+
+class Replay_Server:
+    """Local HTTP stand-in for pro-football-reference.com serving recorded fixtures."""
+    root='https://www.pro-football-reference.com'
+
+    def __init__(self,fixture_dir,host='127.0.0.1',port=0,latency=0,error_rates=None,seed=None):
+        fixtures=Fixture_Store(fixture_dir)
+        faults=Fault_Injector(latency,error_rates,seed)
+        root=self.root
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fault=faults.next_fault()
+                if fault=='throttled':
+                    return self.respond(429,b'Rate Limited Request',{'Retry-After':'1'})
+                if fault=='blocked':
+                    return self.respond(403,b'Access Denied')
+                if fault=='transient':
+                    return self.respond(503,b'Service Unavailable')
+                html=fixtures.get(root+self.path)
+                if html is None:
+                    return self.respond(404,b'Not Found')
+                body=html.encode('utf-8')
+                etag='"'+hashlib.sha256(body).hexdigest()[:16]+'"'
+                if self.headers.get('If-None-Match')==etag:
+                    return self.respond(304,b'',{'ETag':etag})
+                self.respond(200,body,{'ETag':etag,'Content-Type':'text/html; charset=utf-8'})
+
+            def respond(self,status,body,headers=None):
+                self.send_response(status)
+                for k,v in (headers or {}).items():
+                    self.send_header(k,v)
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self,format,*args):
+                logging.debug('Replay_Server: '+format%args)
+
+        self.httpd=ThreadingHTTPServer((host,port),Handler)
+        self.url=f'http://{host}:{self.httpd.server_address[1]}'
+        self.thread=threading.Thread(target=self.httpd.serve_forever,daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*exc):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+        logging.info(f'Replay server listening on {self.url}')
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,40 +1,331 @@
 import pandas as pd
 import hashlib
+import logging
+import os
+import threading
 import numpy as np
-from bs4 import BeautifulSoup
+from pathlib import Path
+from bs4 import BeautifulSoup, Tag
 from abc import abstractmethod, ABC
 
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError: # falls back to a full html.parser soup, which is slower but needs nothing extra
+    lxml_html=None
+
+try:
+    import pyarrow # parquet engine for Table_Cache and Parquet_Exporter
+except ImportError:
+    pyarrow=None
+
+EXTRACT_VERSION='1' # bump whenever ExtractTable changes what it reads out of a page, invalidates every cached table
+
 class ExtractionFailed(Exception):
     pass
 
+class Page_Index:
+    """Single parse of a page, indexing only the registered ids, classes and data-templates."""
+    def __init__(self,html,ids=(),classes=(),templates=()):
+        self.ids=set(ids)
+        self.classes=set(classes)
+        self.templates=set(templates)
+        self.elements={}
+        self.nodes={} # lxml elements by id, for the bulk table reader
+        self.tags={} # lxml element -> its BeautifulSoup copy, built on first lookup
+        if lxml_html is not None:
+            self.index_lxml(html)
+        else:
+            self.index_soup(html)
+
+    def index_lxml(self,html):
+        if isinstance(html,str):
+            html=html.encode('utf-8')
+        tree=lxml_html.document_fromstring(html,parser=lxml_html.HTMLParser(encoding='utf-8'))
+        conditions=[f'@id="{i}"' for i in self.ids]
+        conditions+=[f'contains(concat(" ",normalize-space(@class)," ")," {c} ")' for c in self.classes]
+        conditions+=[f'@data-template="{t}"' for t in self.templates]
+        if not conditions:
+            return
+        for el in tree.xpath(f'//*[{" or ".join(conditions)}]'):
+            self.file(el)
+            if el.get('id') is not None:
+                self.nodes[el.get('id')]=el
+
+    def index_soup(self,html):
+        soup=BeautifulSoup(html,'html.parser')
+        for tag in soup.find_all(self.wanted):
+            self.file(tag)
+
+    def wanted(self,tag):
+        classes=tag.get('class') or []
+        return tag.get('id') in self.ids or tag.get('data-template') in self.templates or any(c in self.classes for c in classes)
+
+    def file(self,el):
+        keys=[('id',el.get('id')),('data-template',el.get('data-template'))]+[('class',c) for c in self.classes_of(el)]
+        for key in keys:
+            if key[1] is not None:
+                self.elements.setdefault(key,[]).append(el)
+
+    @staticmethod
+    def classes_of(el):
+        classes=el.get('class') or []
+        return classes.split() if isinstance(classes,str) else classes # lxml keeps the raw attribute
+
+    def tag(self,el):
+        if isinstance(el,Tag):
+            return el
+        if el not in self.tags:
+            fragment=etree.tostring(el,encoding='unicode',with_tail=False,method='html')
+            self.tags[el]=BeautifulSoup(fragment,'html.parser').find(el.tag)
+        return self.tags[el]
+
+    def find_all(self,name=None,attrs=None,id=None,class_=None):
+        attrs=dict(attrs or {})
+        if id is not None:
+            attrs['id']=id
+        if class_ is not None:
+            attrs['class']=class_
+        if not attrs:
+            raise ValueError('Page_Index lookups need an id, class_ or attribute filter')
+        key,value=next(iter(attrs.items()))
+        if key=='class' and value not in self.classes:
+            value=value.split()[0] # multi-class strings are indexed under each of their classes
+        matches=self.elements.get((key,value),[])
+        return [self.tag(el) for el in matches if (name is None or (el.name if isinstance(el,Tag) else el.tag)==name) and all(self.matches(el,k,v) for k,v in attrs.items())]
+
+    def matches(self,el,key,value):
+        if key=='class':
+            classes=self.classes_of(el)
+            return value in classes or value==' '.join(classes)
+        return el.get(key)==value
+
+    def find(self,name=None,attrs=None,id=None,class_=None):
+        matches=self.find_all(name,attrs,id=id,class_=class_)
+        return matches[0] if matches else None
+
+    def node(self,id):
+        return self.nodes.get(id)
+
 def ExtractRows(soup,id):
+    """Body rows of a table without the repeated header rows, plus a data-stat -> label map."""
     james = soup.find('table', id=id)
+    if james is None:
+        raise ExtractionFailed(f'No table with id {id}')
+    node=soup.node(id) if isinstance(soup,Page_Index) else None
+    if node is not None:
+        rows=node.xpath('./tbody/tr[not(contains(concat(" ",@class," ")," thead "))]')
+        labels={th.get('data-stat'):th.text_content().strip() for th in node.xpath('./thead/tr[last()]/th')}
+        return rows, labels
     table = james.find('tbody')
-    rows = table.find_all('tr')
+    rows = [row for row in table.find_all('tr') if 'thead' not in (row.get('class') or [])]
     thead = james.find('thead')
+    labels = {}
     if thead:
         header_rows = thead.find_all('tr')
         if header_rows:
-            headers = [th.get_text(strip=True) for th in header_rows[-1].find_all('th')]
-    else:
-        headers = None
-    return rows, headers
-
-def ExtractTable(soup,id):
-    rows, headers = ExtractRows(soup,id)
-    table_data = []
-    for row in rows:
-        cells = row.find_all(['td', 'th'])
-        row_data = [cell.get_text(strip=True) for cell in cells]
-        table_data.append(row_data)
-    df = pd.DataFrame(table_data, columns=headers)
+            labels = {th.get('data-stat'):th.get_text(strip=True) for th in header_rows[-1].find_all('th')}
+    return rows, labels
+
+def ExtractTable(soup,id,names=None,convert=True):
+    """Reads a table into columns keyed by data-stat, so repeated header labels never collide."""
+    if isinstance(soup,Cached_Page):
+        return soup.table(id,names,convert)
+    rows, labels = ExtractRows(soup,id)
+    names = {**{k:v for k,v in labels.items() if k is not None}, **(names or {})}
+    n_rows=len(rows)
+    columns={}
+    soup_rows=n_rows>0 and isinstance(rows[0],Tag)
+    for r,row in enumerate(rows):
+        cells=row.find_all(['td','th'],recursive=False) if soup_rows else row
+        for cell in cells:
+            stat=cell.get('data-stat')
+            if stat is None:
+                continue
+            col=columns.get(stat)
+            if col is None:
+                col=columns[stat]=['']*n_rows
+            col[r]=cell.get_text(strip=True) if soup_rows else cell.text_content().strip()
+    order=[stat for stat in labels if stat in columns]+[stat for stat in columns if stat not in labels]
+    header_row=[names.get(stat,stat) for stat in order]
+    keep=np.ones(n_rows,dtype=bool)
+    if order: # header rows that slipped past the thead class repeat the header text in their first cell, e.g. Player or No.
+        keep=np.array(columns[order[0]],dtype=object)!=header_row[0]
+    data={}
+    for i,stat in enumerate(order):
+        values=np.array(columns[stat],dtype=object)[keep]
+        data[i]=ConvertColumn(values) if convert else values
+    df=pd.DataFrame(data,index=pd.RangeIndex(int(keep.sum())))
+    df.columns=header_row
     return df
 
+def ConvertTable(df):
+    data={i:ConvertColumn(df.iloc[:,i].to_numpy(dtype=object)) for i in range(df.shape[1])}
+    converted=pd.DataFrame(data,index=pd.RangeIndex(len(df)))
+    converted.columns=df.columns
+    return converted
+
+def ConvertColumn(values):
+    """Blanks become 0 and all-numeric columns become int64/float64."""
+    blank=values==''
+    filled=values.copy()
+    filled[blank]='0'
+    numeric=pd.to_numeric(filled,errors='coerce')
+    if np.isnan(numeric).any():
+        values=values.copy()
+        values[blank]=0
+        return values
+    if (numeric==np.round(numeric)).all():
+        return numeric.astype(np.int64)
+    return numeric.astype(np.float64)
+
+class Table_Cache:
+    """Extracted tables stored as parquet, keyed by page hash and definition fingerprint."""
+    def __init__(self,path):
+        self.path=Path(path)
+        self.hits=0
+        self.misses=0
+
+    @staticmethod
+    def page_key(html):
+        if isinstance(html,str):
+            html=html.encode('utf-8')
+        return hashlib.sha256(html).hexdigest()
+
+    @staticmethod
+    def fingerprint(*parts):
+        return hashlib.sha256(repr((EXTRACT_VERSION,)+parts).encode('utf-8')).hexdigest()[:12]
+
+    def file(self,page_key,name,fingerprint):
+        return self.path/page_key[:2]/page_key/f'{name}-{fingerprint}.parquet'
+
+    def get(self,page_key,name,fingerprint):
+        path=self.file(page_key,name,fingerprint)
+        if not path.exists():
+            self.misses+=1
+            return None
+        self.hits+=1
+        df=pd.read_parquet(path)
+        df.columns=[col.split(':',1)[1] for col in df.columns] # labels can repeat (Yds for passing and for sacks), so they're stored with their position
+        return df
+
+    def put(self,page_key,name,fingerprint,df):
+        path=self.file(page_key,name,fingerprint)
+        path.parent.mkdir(parents=True,exist_ok=True)
+        stored=df.copy()
+        stored.columns=[f'{i}:{col}' for i,col in enumerate(df.columns)]
+        tmp=path.with_suffix(f'.{os.getpid()}-{threading.get_ident()}.tmp') # parse workers, processes or threads, may finish the same page at once
+        stored.to_parquet(tmp,index=False)
+        os.replace(tmp,path)
+
+    def summary(self):
+        return f'{self.hits} cached tables reused, {self.misses} extracted'
+
+class Cached_Page:
+    """Page_Index stand-in that reads tables from the Table_Cache and only parses on a miss."""
+    def __init__(self,html,cache,parse):
+        self.cache=cache
+        self.key=cache.page_key(html)
+        self.html=html
+        self.parse=parse
+        self.index=None
+
+    def page(self):
+        if self.index is None:
+            self.index=self.parse(self.html)
+            self.html=None
+        return self.index
+
+    def table(self,id,names=None,convert=True):
+        fingerprint=self.cache.fingerprint(id,sorted((names or {}).items()))
+        df=self.cache.get(self.key,id,fingerprint)
+        if df is None:
+            df=ExtractTable(self.page(),id,names,convert=False)
+            self.cache.put(self.key,id,fingerprint,df)
+        return ConvertTable(df) if convert else df
+
+    def record(self,name,fingerprint,extract):
+        fingerprint=self.cache.fingerprint(name,fingerprint)
+        df=self.cache.get(self.key,name,fingerprint)
+        if df is None:
+            df=pd.DataFrame([extract(self.page())])
+            self.cache.put(self.key,name,fingerprint,df)
+        return df.iloc[0].to_dict()
+
+    def find(self,*args,**kwargs):
+        return self.page().find(*args,**kwargs)
+
+    def find_all(self,*args,**kwargs):
+        return self.page().find_all(*args,**kwargs)
+
+    def node(self,id):
+        return self.page().node(id)
+
+class Player_Registry:
+    """Player ids kept across seasons in a csv of (normalized name, birthdate) -> id."""
+    columns=['normalized_name','birthdate','Player']
+
+    def __init__(self,path):
+        self.path=Path(path)
+        if self.path.exists():
+            table=pd.read_csv(self.path,dtype=str,keep_default_na=False)
+        else:
+            table=pd.DataFrame({col:pd.Series(dtype=str) for col in self.columns})
+        self.index=pd.Index(self.keys(table['normalized_name'],table['birthdate']).to_numpy(dtype=object))
+        self.ids=table['Player'].to_numpy(dtype=object)
+        self.taken=set(self.ids)
+        self.new=[]
+        self.hits=0
+        self.collisions=0
+
+    @staticmethod
+    def keys(names,births):
+        return names.astype(str).str.lower()+births.astype(str).str.replace('/','',regex=False)
+
+    def lookup(self,names,births):
+        keys=self.keys(names,births).to_numpy(dtype=object)
+        positions=self.index.get_indexer(keys)
+        missing=positions==-1
+        self.hits+=int((~missing).sum())
+        if missing.any():
+            new=pd.DataFrame({'key':keys[missing],'name':names.to_numpy(dtype=object)[missing],'birth':births.to_numpy(dtype=object)[missing]}).drop_duplicates('key')
+            ids=[self.insert(key,name,birth) for key,name,birth in new.itertuples(index=False)]
+            self.index=self.index.append(pd.Index(new['key'].to_numpy()))
+            self.ids=np.concatenate([self.ids,np.array(ids,dtype=object)])
+            positions=self.index.get_indexer(keys)
+        return pd.Series(self.ids[positions],index=names.index)
+
+    def insert(self,key,name,birth):
+        digest=hashlib.sha256(key.encode('utf-8')).hexdigest()
+        length=8
+        while digest[:length] in self.taken:
+            logging.warning(f'Player id {digest[:length]} is already taken, lengthening the id for {name} ({birth}).')
+            self.collisions+=1
+            length+=1
+        player=digest[:length]
+        self.taken.add(player)
+        self.new.append((name,birth,player))
+        return player
+
+    def save(self):
+        if not self.new:
+            return
+        self.path.parent.mkdir(parents=True,exist_ok=True)
+        first=not self.path.exists()
+        pd.DataFrame(self.new,columns=self.columns).to_csv(self.path,mode='w' if first else 'a',header=first,index=False)
+        self.new=[]
+
+    def summary(self):
+        return f'{self.hits} players found in the registry, {len(self.ids)} known, {self.collisions} id collisions'
+
 class DIM_Players_Mixin:
-    def generate_player_id(self, name_col, birth_col):
+    def generate_player_id(self, name_col, birth_col, registry=None):
         self.df['normalized_name'] = self.normalize_names_column(name_col)
         self.df['Name'] = self.df['Player']
-        self.df['Player'] = self.generate_hash(self.df['normalized_name'], birth_col)
+        if registry is not None:
+            self.df['Player'] = registry.lookup(self.df['normalized_name'], birth_col)
+        else:
+            self.df['Player'] = self.generate_hash(self.df['normalized_name'], birth_col)
         self.df['Player_ID'] = self.df['Player'] + f'_{self.year}'
         self.df.drop(columns=[c for c in ['normalized_name', 'Birthdate_str'] if c in self.df.columns], inplace=True)
         cols=['Player_ID','Player','Name']+[c for c in self.df.columns if c not in ['Player_ID','Player','Name']]
@@ -42,11 +333,11 @@ class DIM_Players_Mixin:
         
     @staticmethod
     def normalize_names_column(col:pd.Series)->pd.Series:
-        suffixes=['jr','sr','iii','ii','iv']
+        """First + last name without suffixes, e.g. Odell Beckham Jr. -> OdellBeckham."""
         col_clean=col.str.replace('-',' ',regex=False)
-        col_split=col_clean.str.split()
-        col_filtered=col_split.apply(lambda parts:[p for p in parts if p.lower().rstrip('.') not in suffixes])
-        return col_filtered.apply(lambda parts:parts[0]+parts[-1] if len(parts)>=2 else parts[0])
+        col_clean=col_clean.str.replace(r'(?i)(?<!\S)(?:jr|sr|iii|ii|iv)\.*(?!\S)','',regex=True)
+        parts=col_clean.str.strip().str.extract(r'^(\S+)(?:.*\s(\S+))?$')
+        return parts[0]+parts[1].fillna('')
 
     @staticmethod
     def generate_hash(name_col,birth_col):
@@ -55,18 +346,74 @@ class DIM_Players_Mixin:
             return np.array([hashlib.sha256(s.encode('utf-8')).hexdigest()[:8] for s in arr])
         return pd.Series(vectorized_sha256(combined),index=name_col.index)
 
-service = Service(ChromeDriverManager().install())
-
 class MissingCols(Exception):
     pass
 
+class Schema:
+    """A category's expected_cols and cleaning rules, compiled once and applied by coerce()."""
+    zero_tokens=['','Rook']
+
+    def __init__(self,expected_cols,cleaning=None):
+        self.dtypes={col:np.dtype(dtype) if dtype is not None else None for col,dtype in expected_cols.items()} # np.dtype(None) would be float64
+        self.cleaning={}
+        for key,rules in (cleaning or {}).items():
+            if isinstance(rules,dict): # {target:{'cols':[...],'replace':...}}
+                for col in rules['cols']:
+                    self.cleaning.setdefault(col,[]).append((key,rules['replace']))
+            else: # {col:[{'target':...,'replace_with':...}]}
+                self.cleaning.setdefault(key,[]).extend((rule['target'],rule['replace_with']) for rule in rules)
+
+    @classmethod
+    def of(cls,category):
+        schema=category.__dict__.get('schema')
+        if schema is None:
+            schema=cls(category.expected_cols,getattr(category,'cleaning',None))
+            category.schema=schema
+        return schema
+
+    def coerce(self,df,keys=()):
+        columns={}
+        bad=[]
+        for i,col in enumerate(df.columns):
+            values=df.iloc[:,i].to_numpy(dtype=object)
+            dtype=self.dtypes.get(col)
+            if col in keys:
+                columns[i]=values
+                continue
+            if dtype is None:
+                columns[i]=ConvertColumn(values)
+                continue
+            text=pd.Series(values,dtype=object).astype(str)
+            for target,replacement in self.cleaning.get(col,[]):
+                text=text.str.replace(target,replacement,regex=False)
+            zero=text.isin(self.zero_tokens).to_numpy()
+            if dtype==object:
+                values=text.to_numpy(dtype=object,copy=True)
+                values[zero]=0
+                columns[i]=values
+                continue
+            numeric=pd.to_numeric(text.str.rstrip('%').where(~zero,'0'),errors='coerce').to_numpy(dtype=np.float64,copy=True)
+            failed=np.isnan(numeric)
+            if failed.any():
+                bad+=[(col,int(row),values[row]) for row in np.flatnonzero(failed)]
+                numeric[failed]=0
+            columns[i]=numeric.astype(dtype)
+        typed=pd.DataFrame(columns,index=pd.RangeIndex(len(df)))
+        typed.columns=df.columns
+        return typed,bad
+
 class Table: # move this to the extractor module
-    def __init__(self,category,soup,validate=True):
+    def __init__(self,category,soup,validate=True,raw=None,keys=()):
         logging.debug(f'\nCreating dataframe for {category.cat}')
         for k,v in category.__dict__.items():
             if not k.startswith('__'):
                 setattr(self,k,v)
-        self.df=ExtractTable(soup,self.id).fillna(0).replace('',0)
+        if raw is None: # otherwise raw is already extracted, e.g. a batch of this category's tables from many games
+            raw=ExtractTable(soup,self.id,getattr(self,'column_names',None),convert=False)
+        self.batch_keys=set(keys)
+        self.df,self.bad_cells=Schema.of(category).coerce(raw,keys)
+        if self.bad_cells:
+            logging.warning(f'{len(self.bad_cells)} cells in {category.cat} could not be read as numbers and were set to 0: {self.bad_cells[:20]}')
         if validate==True:
             self.shapecheck()
 
@@ -79,86 +426,83 @@ class Table: # move this to the extractor module
             logging.critical(f'Shapecheck failed. The table is missing the following columns: {self.missing_cols}.')
             raise MissingCols
         
-        leftover_cols=actual_cols-expected
+        leftover_cols=actual_cols-expected-getattr(self,'batch_keys',set())
         
         if leftover_cols:
             logging.warning(f'Shapecheck succeeded, however there are more columns than expected. Unexpected columns: {leftover_cols}. These will be retained.')
 
-    def typecheck(self):
-        for col in self.df.columns:
-            expectedtype=self.expected_cols[col]
-            actualtype=self.df[col].dtypes
-            if expectedtype==actualtype:
-                logging.debug('Typecheck succeeded')
+class Fact(Table):
+    pass
+
+def safe_divide(numerator,denominator):
+    """Elementwise numerator/denominator with 0 wherever the denominator is 0."""
+    out=np.zeros(len(numerator),dtype=np.float64)
+    np.divide(numerator,denominator,out=out,where=denominator!=0)
+    return out
+
+class Calc_Plan:
+    """A Stat_Cat compiled once at class creation into dtypes, derived columns and stat ids."""
+    ops={
+        'avg':lambda a,b:safe_divide(a,b),
+        'pct':lambda a,b:safe_divide(a*100,b),
+        'tot':lambda a,b:a*b,
+        'sum':lambda a,b:a+b
+    }
+
+    def __init__(self,category):
+        self.ids=['Player','Tm']
+        self.dtypes={col:dtype for col,dtype in category.expected_cols.items() if col not in self.ids}
+        self.columns=list(self.dtypes) # every column the plan fills, extracted first and derived after, by position
+        self.derived=[]
+        for op,cols in getattr(category,'calc_columns',{}).items():
+            if op not in self.ops:
+                raise ValueError(f'{category.__name__} uses an unknown calculation: {op}')
+            for col,(a,b) in cols.items():
+                self.derived.append((self.position(col),op,self.position(a),self.position(b)))
+        produced=set(self.dtypes)|{self.columns[out] for out,op,x,y in self.derived}
+        unresolved=[col for col in self.columns+list(category.value_vars) if col not in produced]
+        if unresolved:
+            raise TypeError(f'{category.__name__} uses columns that are neither extracted nor calculated: {unresolved}')
+        self.values=[self.position(col) for col in category.value_vars]
+        self.stat_ids=np.array([category.stat_lookup.get(col,0) for col in category.value_vars],dtype=object)
+        self.wide_names=[category.stat_lookup.get(col,col) for col in category.value_vars]
+        self.wide_dtypes={name:self.dtypes.get(col,np.float64) for name,col in zip(self.wide_names,category.value_vars)}
+
+        self.summary_stats=list(getattr(category,'summary_stats',[]))
+        self.season_derived=[]
+        self.season_means=[]
+        for op,cols in getattr(category,'season_calcs',{}).items():
+            if op=='sum': # nothing to recompute, these are summary stats
                 continue
-            else:
-                logging.debug(f'{col} failed typecheck. Expected type: {expectedtype}. Actual type: {actualtype}. Attempting conversion...')
-                try:
-                    self.df[col]=self.df[col].astype(expectedtype)
-                    logging.debug('Successfully converted to expected type.')
-                except Exception as e:
-                    logging.error(f'Unable to convert{col}- {e}')
+            for col,(a,b) in cols.items():
+                if op=='rat':
+                    self.season_means.append(col)
+                else:
+                    self.season_derived.append((col,op,a,b))
 
-    def clean_table(self):
-        for col, rules in self.cleaning.items():
-            for rule in rules:
-                dirtychar = rule['target']
-                replacement = rule['replace_with']
-                self.df[col] = self.df[col].str.replace(dirtychar, replacement, regex=False)
+    def position(self,col):
+        if col not in self.columns:
+            self.columns.append(col)
+        return self.columns.index(col)
 
+    def column(self,df,col):
+        return df[col].to_numpy().astype(self.dtypes[col],copy=False) # already typed by the category's Schema
 
-class Fact(Table):
-    def summerge(self,merged_df): #pass a pre-merged df into this. Does not have merging logic since it's very context-dependent
-            calc_cols=convert_col_names(merged_df)
-            for col in calc_cols:
-                merged_df[col]=merged_df[f'{col}_x']+merged_df[f'{col}_y']
-                merged_df.drop(columns=[f'{col}_x',f'{col}_y'],inplace=True)
-            return merged_df 
-
-    def convert_col_names(self,df):
-        cols=df.columns
-        cols=[col for col in cols if '_x' in col or '_y' in col]
-        col_count=len(cols)
-        if col_count%2==1:
-            raise TypeError('An unmatched value column was passed into summerge.')
-        if col_count==0:
-            logging.warning('No value columns passed into summerge.')
-        clean_cols=[]
-        for col in cols:
-            col=col.replace('_x','')
-            clean_cols.append(col)
-        return clean_cols
-    
-    def calculate_values(self):
-        self.clean_and_convert(self.category)
-
-        for calc in self.category.calc_columns:
-            dicref=self.category.calc_columns[calc]
-            for col in dicref:
-                nestref=dicref[col]
-                if calc=='avg':
-                    self.df[col]=self.df[nestref[0]]/self.df[nestref[1]]
-                if calc=='pct':
-                    self.df[col]=(self.df[nestref[0]]*100)/self.df[nestref[1]]
-                if calc=='tot':
-                    self.df[col]=self.df[nestref[0]]*self.df[nestref[1]]
-                if calc=='sum':
-                    self.df[col]=self.df[nestref[0]]+self.df[nestref[1]]
-        logging.info(f'After calculating, this is the table:\n\n{self.df}')
-
-        self.df=self.df[self.category.col_order]
-
-    def long_now(self):
-        logging.info(f'Before lengthening, this is the dataframe:\n\n{self.df}')
-        self.df=self.df.melt(id_vars=['Player','Tm'],value_vars=self.value_vars,var_name='Stat',value_name='Value')
-
-        self.df['Stat']=self.df['Stat'].map(self.stat_lookup).fillna(0)
-
-    def clean_and_convert(self,category):
-        cleaning = getattr(category, 'cleaning', None)
-        if cleaning:
-            self.clean_table()
-        self.df = self.df.astype(category.expected_cols)
+    def run(self,df,keys=(),wide=False):
+        n=len(df)
+        arrays=[None]*len(self.columns)
+        for i,col in enumerate(self.dtypes):
+            arrays[i]=self.column(df,col)
+        for out,op,a,b in self.derived:
+            arrays[out]=self.ops[op](arrays[a].astype(np.float64),arrays[b].astype(np.float64))
+        if wide:
+            columns={col:df[col].to_numpy(dtype=object) for col in self.ids+list(keys)}
+            columns.update({name:arrays[i] for name,i in zip(self.wide_names,self.values)})
+            return pd.DataFrame(columns)
+        long={col:np.tile(df[col].to_numpy(dtype=object),len(self.values)) for col in self.ids+list(keys)}
+        long['Stat']=np.repeat(self.stat_ids,n)
+        long['Value']=np.concatenate([arrays[i].astype(np.float64) for i in self.values]) if self.values else np.empty(0)
+        return pd.DataFrame(long)
 
 class Dim_Check(ABC):
     @property
@@ -179,14 +523,82 @@ class Dimension(Table,Dim_Check):
         self.dup_df=df[dup_mask].sort_values(self.primary_key)
         raise TypeError
 
-class Exporter:
-    def __init__(self):
-        export_df_objects=[]
-        validated_dfs=[]
+class Fact_Encoder:
+    """Integer surrogate keys for a fact table's dimension columns, shared across chunks."""
+    def __init__(self,dimensions,value='Value',value_dtype=np.float32):
+        self.dimensions=dimensions # column -> integer dtype of its keys
+        self.value=value
+        self.value_dtype=value_dtype
+        self.keys={col:{} for col in dimensions}
+
+    def encode(self,df):
+        columns={}
+        for col in df.columns:
+            if col in self.dimensions:
+                columns[f'{col}_Key']=self.encode_column(col,df[col])
+            elif col==self.value:
+                columns[col]=pd.to_numeric(df[col],errors='coerce').to_numpy().astype(self.value_dtype)
+            else:
+                columns[col]=df[col].to_numpy()
+        return pd.DataFrame(columns,index=pd.RangeIndex(len(df)))
+
+    def encode_column(self,col,values):
+        keys=self.keys[col]
+        codes,uniques=pd.factorize(values)
+        for value in uniques:
+            if value not in keys:
+                keys[value]=len(keys)
+        lookup=np.array([keys[value] for value in uniques]+[-1],dtype=self.dimensions[col])
+        return lookup[codes] # factorize marks missing values -1, which picks the trailing -1
+
+    def dictionaries(self):
+        return {col:pd.DataFrame({f'{col}_Key':np.arange(len(keys),dtype=self.dimensions[col]),col:list(keys)}) for col,keys in self.keys.items()}
+
+class Exporter(ABC):
+    """Destination for a season's tables, written chunk by chunk with their partition."""
+    @abstractmethod
+    def write(self,name,df,partition=None):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+class Parquet_Exporter(Exporter):
+    """Each table as a parquet dataset partitioned by year and week."""
+    def __init__(self,path,compression='zstd'):
+        if pyarrow is None:
+            raise ImportError('Parquet_Exporter needs pyarrow.')
+        self.path=Path(path)
+        self.compression=compression
+        self.parts={} # partition folder -> files this run has written to it
+        self.rows={}
+
+    def write(self,name,df,partition=None):
+        folder=self.path/name
+        for key,value in (partition or {}).items():
+            folder=folder/f'{key}={value}'
+        if folder not in self.parts:
+            folder.mkdir(parents=True,exist_ok=True)
+            for stale in folder.glob('*.parquet'):
+                stale.unlink()
+            self.parts[folder]=0
+        df=self.arrow_types(df)
+        file=folder/f'part-{self.parts[folder]}.parquet'
+        tmp=folder/f'.{file.name}.tmp' # dot files are skipped by dataset readers
+        text=[col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])]
+        df.to_parquet(tmp,index=False,compression=self.compression,use_dictionary=text)
+        os.replace(tmp,file)
+        self.parts[folder]+=1
+        self.rows[name]=self.rows.get(name,0)+len(df)
+
+    @staticmethod
+    def arrow_types(df):
+        # mixed or empty object columns go out as strings so every chunk shares a schema
+        loose=[col for col in df.columns if df[col].dtype==object and pd.api.types.infer_dtype(df[col],skipna=True) in ('mixed','mixed-integer','empty')]
+        return df.astype({col:'string' for col in loose}) if loose else df
 
-        for obj in export_df_objects:
-            obj.validate_export()
-            validated_dfs.append(obj.df)
+    def close(self):
+        logging.info(f'Parquet datasets written to {self.path}: {self.rows}')
 
 def start_html_scraper(url):
     html=requests.get(url)
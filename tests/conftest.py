@@ -0,0 +1,4 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0,str(Path(__file__).resolve().parents[1])) # extractor.py lives at the repo root
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from extractor import Fact_Encoder, Schema
+
+
+def test_fact_encoder_ignores_the_input_index():
+    df=pd.DataFrame({'Player':['a','b','a'],'Stat':['P1','P1','P2'],'Value':[1,2,3]},index=[0,0,1]) # per-game frames concatenated
+    encoded=Fact_Encoder({'Player':np.int32,'Stat':np.int16}).encode(df)
+    assert encoded['Value'].tolist()==[1.0,2.0,3.0]
+    assert encoded['Player_Key'].tolist()==[0,1,0]
+
+
+def test_schema_keeps_text_columns():
+    raw=pd.DataFrame({'Player':['Tom Brady','Rook'],'Tm':['TAM','KAN'],'Yds':['12','Rook'],'Cmp%':['50.0%','']})
+    typed,bad=Schema({'Player':None,'Tm':object,'Yds':np.int64,'Cmp%':np.float64}).coerce(raw)
+    assert typed['Player'].tolist()==['Tom Brady','Rook']
+    assert typed['Tm'].tolist()==['TAM','KAN']
+    assert typed['Yds'].tolist()==[12,0]
+    assert typed['Cmp%'].tolist()==[50.0,0.0]
+    assert bad==[]
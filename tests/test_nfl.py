@@ -0,0 +1,145 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+nfl_dir=Path(__file__).resolve().parents[1]/'NFL'
+sys.path.insert(0,str(nfl_dir))
+cwd=os.getcwd()
+os.chdir(nfl_dir) # NFL.py reads teams.json and stats.json from the working directory
+try:
+    import NFL
+except (ImportError,FileNotFoundError) as e:
+    pytest.skip(f'NFL.py cannot be imported here: {e}',allow_module_level=True)
+finally:
+    os.chdir(cwd)
+
+
+def test_fact_scoring_rows():
+    details=pd.Series([
+        'Derrick Henry 12 yard rush (Nick Folk kick)',
+        'Travis Kelce 20 yard pass from Patrick Mahomes (Harrison Butker kick)',
+        'Justin Tucker 45 yard field goal',
+        'Safety, Jalen Hurts sacked in end zone by Aaron Donald',
+        'Josh Allen 3 yard rush (Josh Allen run)',
+        'Stefon Diggs 8 yard pass from Josh Allen (pass failed)',
+        'Mike Evans 15 yard pass from Tom Brady (Chris Godwin pass from Tom Brady)',
+        'Micah Parsons fumble return (Brett Maher kick failed)',
+        'Devin Hester 92 yard punt return (Robbie Gould kick)',
+        'Cordarrelle Patterson 103 yard kickoff return'
+    ],index=['td_rush','td_pass','fg','safety','xp_run','xp_failed','xp_pass','fumble','punt','kickoff'])
+    rows=NFL.Fact_Scoring(details).df
+    got=[(score,None if pd.isna(scorer) else scorer,detail,value) for score,scorer,detail,value in rows.itertuples(index=False)]
+    assert got==[ # same rows and order as the row-at-a-time parser it replaced
+        ('td_pass','Travis Kelce','Passer','Patrick Mahomes'),
+        ('xp_failed','Stefon Diggs','Passer','Josh Allen'),
+        ('xp_pass','Mike Evans','Passer','Tom Brady'),
+        ('xp_pass','Chris Godwin','Passer','Tom Brady'),
+        ('td_rush','Derrick Henry','Type','TD'),
+        ('td_rush','Nick Folk','Type','XP'),
+        ('td_pass','Travis Kelce','Type','TD'),
+        ('td_pass','Harrison Butker','Type','XP'),
+        ('fg','Justin Tucker','Type','FG'),
+        ('safety',None,'Type','Safety'),
+        ('xp_run','Josh Allen','Type','TD'),
+        ('xp_run','Josh Allen','Type','XP'),
+        ('xp_failed','Stefon Diggs','Type','TD'),
+        ('xp_failed',None,'Type','XP'),
+        ('xp_pass','Mike Evans','Type','TD'),
+        ('xp_pass','Chris Godwin','Type','XP'),
+        ('fumble','Micah Parsons','Type','TD'),
+        ('fumble',None,'Type','XP'),
+        ('punt','Devin Hester','Type','TD'),
+        ('punt','Robbie Gould','Type','XP'),
+        ('kickoff','Cordarrelle Patterson','Type','TD'),
+        ('td_rush','Derrick Henry','Distance',12.0),
+        ('td_pass','Travis Kelce','Distance',20.0),
+        ('fg','Justin Tucker','Distance',45.0),
+        ('xp_run','Josh Allen','Distance',3.0),
+        ('xp_failed','Stefon Diggs','Distance',8.0),
+        ('xp_pass','Mike Evans','Distance',15.0),
+        ('fumble','Micah Parsons','Distance',0.0),
+        ('punt','Devin Hester','Distance',92.0),
+        ('kickoff','Cordarrelle Patterson','Distance',103.0),
+        ('td_rush','Derrick Henry','Method','rush'),
+        ('td_rush','Nick Folk','Method','kick'),
+        ('td_pass','Travis Kelce','Method','pass'),
+        ('td_pass','Harrison Butker','Method','kick'),
+        ('xp_run','Josh Allen','Method','rush'),
+        ('xp_run','Josh Allen','Method','run'),
+        ('xp_failed','Stefon Diggs','Method','pass'),
+        ('xp_failed',None,'Method','pass'),
+        ('xp_pass','Mike Evans','Method','pass'),
+        ('xp_pass','Chris Godwin','Method','pass'),
+        ('fumble','Micah Parsons','Method','interception return'),
+        ('fumble',None,'Method','kick'),
+        ('punt','Devin Hester','Method','punt return'),
+        ('punt','Robbie Gould','Method','kick'),
+        ('kickoff','Cordarrelle Patterson','Method','kickoff return'),
+        ('td_rush','Nick Folk','Good',True),
+        ('td_pass','Harrison Butker','Good',True),
+        ('xp_run','Josh Allen','Good',True),
+        ('xp_failed',None,'Good',False),
+        ('xp_pass','Chris Godwin','Good',True),
+        ('fumble',None,'Good',False),
+        ('punt','Robbie Gould','Good',True)
+    ]
+
+
+def test_fact_scoring_no_scores():
+    assert NFL.Fact_Scoring(pd.Series([],dtype=object)).df.empty
+
+
+def test_fill_quarters_carries_down_and_maps_ot():
+    quarters=pd.Series(['1','','2','','OT',''],dtype=object)
+    assert NFL.Scoring_Tables.fill_quarters(quarters).tolist()==[1,1,2,2,5,5]
+
+
+
+weekly_lines=[ # Rook has a zero-attempt week and sits out W2, Kelce's C12 is a per-game mean
+    ('Tom Brady','TAM','W1',{'P1':20,'P2':30,'P3':250}),
+    ('Rook','KAN','W1',{'P1':0,'P2':0,'P3':0}),
+    ('Travis Kelce','KAN','W1',{'C1':6,'C12':4.5}),
+    ('Tom Brady','TAM','W2',{'P1':25,'P2':35,'P3':300}),
+    ('Tom Brady','TAM','W3',{'P1':18,'P2':24,'P3':190}),
+    ('Rook','KAN','W3',{'P1':3,'P2':5,'P3':40}),
+    ('Travis Kelce','KAN','W3',{'C1':8,'C12':5.5})
+]
+weeks=['W1','W2','W3']
+
+
+def season_aggregator():
+    return NFL.Season_Aggregator([NFL.Passing,NFL.Receiving])
+
+
+def test_season_totals_same_streamed_or_at_once():
+    facts=pd.DataFrame([(player,tm,stat,value,week) for player,tm,week,stats in weekly_lines for stat,value in stats.items()],columns=['Player','Tm','Stat','Value','Week_ID'])
+    whole=season_aggregator().add(facts)
+    aggregator=season_aggregator()
+    streamed=pd.concat([aggregator.add(facts[facts['Week_ID']==week]) for week in weeks],ignore_index=True)
+    pd.testing.assert_frame_equal(streamed,whole)
+
+    totals=whole.set_index(['Player','Game_ID','Stat'])['Value']
+    assert totals[('Rook','W1','P4')]==0 # 0 yards on 0 attempts
+    assert totals[('Rook','W2','P2')]==0 # carried through the skipped week
+    assert totals[('Rook','W3','P4')]==8
+    assert totals[('Travis Kelce','W3','C12')]==5 # averaged over the weeks played
+    assert totals[('Tom Brady','W3','P3')]==740
+
+
+def test_wide_season_totals_same_streamed_or_at_once():
+    facts=pd.DataFrame([{'Player':player,'Tm':tm,'Week_ID':week,**stats} for player,tm,week,stats in weekly_lines if 'P1' in stats])
+    whole=season_aggregator().add_wide(facts,'FACT_Passing')
+    aggregator=season_aggregator()
+    streamed=pd.concat([aggregator.add_wide(facts[facts['Week_ID']==week],'FACT_Passing') for week in weeks],ignore_index=True)
+    pd.testing.assert_frame_equal(streamed,whole)
+    assert whole[['Player','Game_ID','P2','P4']].values.tolist()==[
+        ['Tom Brady','W1',30,250/30],
+        ['Rook','W1',0,0],
+        ['Tom Brady','W2',65,550/65],
+        ['Rook','W2',0,0],
+        ['Tom Brady','W3',89,740/89],
+        ['Rook','W3',5,8]
+    ]